@@ -0,0 +1,398 @@
+"""
+Benchmark runner for the SSE scheme: corpus generation, document encryption, index build, trapdoor generation,
+search and search over the network, over parameter grids.
+
+    python -m benchmarks.runner --suite quick --suite search_vs_documents
+    python -m benchmarks.runner --suite quick --save-baseline benchmarks/baseline.json
+
+Every measurement is repeated after a few untimed warm-up runs and reported as min / median / p99 / mean seconds.
+Corpora are generated once per parameter set and cached under data/bench/corpora/<hash>, so grids sharing a corpus
+(and later runs) skip generation. With --baseline, the medians are compared with a stored result file and the run
+exits with status 1 when any of them regressed by more than --tolerance.
+(--baseline defaults to benchmarks/baseline.json and is skipped when that file does not exist.)
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import shutil
+import hashlib
+import argparse
+import platform
+import itertools
+import statistics
+import tempfile
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.client import ENCRYPTED_FOLDER, SEGMENT_NAME, Client
+from core.network import NetworkServer, RemoteServer
+from core.pipeline import scan_documents
+from core.segment import SegmentStore
+from core.server import Server
+from utils import generators
+
+CORPUS_CACHE = "data/bench/corpora"
+RESULTS_FILE = "data/bench/results.json"
+BASELINE_FILE = "benchmarks/baseline.json"
+COMPLETE_MARKER = ".complete"  # written once a cached corpus is fully generated
+REPEAT = 10
+WARMUP = 2
+TOLERANCE = 0.20  # allowed slowdown of a median against the baseline
+SEED = 1234
+NETWORK_QUERIES = 2000  # searches pipelined per run of the network stage
+NETWORK_KEYWORDS = 4    # longest lists searched by the network stage, round-robin
+
+GENERATORS = {
+    "proportions": generators.generate_documents,                             # DISEASE_PROPORTIONS, fixed disease share
+    "fixed_keyword": generators.generate_documents_fixed_keyword,             # exactly keyword_count docs with keyword
+    "keywords_per_doc": generators.generate_documents_with_keywords_per_doc,  # exactly keywords_per_doc per document
+    "corpus": generators.generate_corpus,                                     # seeded, Zipfian, multi-process
+}
+
+STAGES = ["generate", "encrypt", "build", "trapdoor", "search", "network"]
+
+# A suite crosses a grid of corpus parameters (passed to its generator) with a grid of options
+# (Client arguments, workers, searched keyword) and measures the listed stages for every combination.
+SUITES = {
+    "quick": {
+        "generator": "proportions",
+        "corpus": {"n": [500]},
+        "options": {},
+        "stages": STAGES,
+    },
+    "generation": {
+        "generator": "proportions",
+        "corpus": {"n": [1000, 10000]},
+        "options": {},
+        "stages": ["generate"],
+        "repeat": 3,
+        "warmup": 0,
+    },
+    "corpus_generation": {
+        "generator": "corpus",
+        "corpus": {"n": [100000], "layout": ["files", "packed"], "workers": [1, 4]},
+        "options": {},
+        "stages": ["generate"],
+        "repeat": 3,
+        "warmup": 1,  # the first run also samples the Faker pools
+    },
+    "encryption": {
+        "generator": "proportions",
+        "corpus": {"n": [10000]},
+        "options": {"doc_mode": ["cbc", "ctr", "gcm"], "workers": [1, 2, 4]},
+        "stages": ["encrypt"],
+    },
+    "index_build": {
+        "generator": "keywords_per_doc",
+        "corpus": {"n": [10000], "keywords_per_doc": [1, 5, 10, 20, 50, 100]},
+        "options": {},
+        "stages": ["build"],
+        "repeat": 3,
+        "warmup": 1,
+    },
+    "trapdoor": {
+        "generator": "keywords_per_doc",
+        "corpus": {"n": [1000], "keywords_per_doc": [10]},
+        "options": {"prf_mode": ["pbkdf2", "hmac", "aes"]},
+        "stages": ["trapdoor"],
+    },
+    "search_vs_documents": {
+        "generator": "fixed_keyword",
+        "corpus": {"n": [100, 500, 1000, 2000, 5000, 10000], "keyword": ["hepatite"], "keyword_count": [50]},
+        "options": {"keyword": ["hepatite"]},
+        "stages": ["search"],
+    },
+    "search_vs_matches": {
+        "generator": "fixed_keyword",
+        "corpus": {"n": [10000], "keyword": ["hepatite"], "keyword_count": [1000, 3000, 5000, 8000]},
+        "options": {"keyword": ["hepatite"]},
+        "stages": ["search"],
+    },
+    "network": {
+        "generator": "proportions",
+        "corpus": {"n": [10000]},
+        "options": {"connections": [1, 2, 4, 8, 16]},
+        "stages": ["network"],
+        "repeat": 5,
+        "warmup": 1,
+    },
+}
+
+CLIENT_OPTIONS = ("node_format", "prf_mode", "doc_mode")
+
+
+def _grid(params: Dict[str, list]) -> List[dict]:
+    keys = sorted(params)
+    return [dict(zip(keys, values)) for values in itertools.product(*(params[key] for key in keys))]
+
+def _summary(durations: List[float]) -> Dict[str, float]:
+    ordered = sorted(durations)
+    return {
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "p99": ordered[max(0, math.ceil(0.99 * len(ordered)) - 1)],  # nearest rank
+        "mean": statistics.mean(ordered),
+    }
+
+def measure(run: Callable, repeat: int = REPEAT, warmup: int = WARMUP, setup: Optional[Callable] = None) -> Dict[str, float]:
+    """
+    Times `run` `repeat` times after `warmup` untimed runs. `setup`, when given, is called (untimed) before every run.
+    """
+    durations = []
+    for i in range(warmup + repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        duration = time.perf_counter() - start
+        if i >= warmup:
+            durations.append(duration)
+    return _summary(durations)
+
+def _generate(generator: str, folder: str, params: dict, seed: int):
+    random.seed(seed)  # the older generators draw from the global generator
+    if generator == "corpus":
+        params = {**params, "seed": seed}
+    GENERATORS[generator](output_folder=folder, **params)
+
+def corpus_path(generator: str, params: dict, seed: int = SEED, cache: str = CORPUS_CACHE) -> str:
+    """
+    Returns the folder of the corpus generated by `generator` with `params` and `seed`, generating it on first use.
+    """
+    spec = json.dumps({"generator": generator, "params": params, "seed": seed}, sort_keys=True)
+    folder = os.path.join(cache, hashlib.sha256(spec.encode()).hexdigest()[:16])
+    if os.path.exists(os.path.join(folder, COMPLETE_MARKER)):
+        return folder
+
+    shutil.rmtree(folder, ignore_errors=True)  # left over by an interrupted generation
+    _generate(generator, folder, params, seed)
+    with open(os.path.join(folder, COMPLETE_MARKER), "w") as f:
+        f.write(spec)
+    return folder
+
+
+class _Case:
+    """
+    State shared by the stages of one grid point. Everything is prepared lazily and untimed, so a suite that only
+    measures search does not pay for a parallel encryption and vice versa.
+    """
+
+    def __init__(self, generator: str, corpus: dict, options: dict, seed: int):
+        self.generator = generator
+        self.corpus = corpus
+        self.options = options
+        self.seed = seed
+        self._documents = None
+        self._index = None
+
+    def client(self, **kwargs) -> Client:
+        return Client(**{key: value for key, value in self.options.items() if key in CLIENT_OPTIONS}, **kwargs)
+
+    def documents(self) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+        if self._documents is None:
+            client = self.client()
+            documents = dict(scan_documents(corpus_path(self.generator, self.corpus, self.seed)))
+            keywords_map = {doc_id: client.extract_keywords(content) for doc_id, content in documents.items()}
+            self._documents = documents, {doc_id: keywords for doc_id, keywords in keywords_map.items() if keywords}
+        return self._documents
+
+    def pairs(self) -> int:
+        return sum(len(keywords) for keywords in self.documents()[1].values())
+
+    def index(self) -> Tuple[Client, Server]:
+        if self._index is None:
+            _, keywords_map = self.documents()
+            client = self.client(expected_pairs=self.pairs())
+            client.build_secure_index(keywords_map, workers=self.options.get("workers", 1))
+            server = Server()
+            server.store_index(client.A, client.T, client.doc_ids)
+            self._index = client, server
+        return self._index
+
+
+def _bench_generate(case: _Case, repeat: int, warmup: int) -> Dict[str, float]:
+    folder = tempfile.mkdtemp(prefix="sse-bench-")
+    try:
+        return measure(lambda: _generate(case.generator, folder, case.corpus, case.seed), repeat, warmup,
+                       lambda: shutil.rmtree(folder, ignore_errors=True))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def _bench_encrypt(case: _Case, repeat: int, warmup: int) -> Dict[str, float]:
+    documents, _ = case.documents()
+    client = case.client()
+    folder = tempfile.mkdtemp(prefix="sse-bench-")
+
+    def setup():
+        # every run writes a fresh segment in a scratch folder instead of appending to data/encrypted_docs
+        for segment in client.segments.values():
+            segment.close()
+        shutil.rmtree(folder, ignore_errors=True)
+        client.segments[ENCRYPTED_FOLDER] = SegmentStore(os.path.join(folder, SEGMENT_NAME))
+
+    try:
+        stats = measure(lambda: client.encrypt_documents(documents, workers=case.options.get("workers", 1)),
+                        repeat, warmup, setup)
+        stats["mb_per_s"] = sum(len(content.encode()) for content in documents.values()) / 1e6 / stats["median"]
+        return stats
+    finally:
+        for segment in client.segments.values():
+            segment.close()
+        shutil.rmtree(folder, ignore_errors=True)
+
+def _bench_build(case: _Case, repeat: int, warmup: int) -> Dict[str, float]:
+    _, keywords_map = case.documents()
+    pairs = case.pairs()
+    state = {}
+
+    def setup():
+        state["client"] = None  # release the index of the previous run before allocating the next one
+        state["client"] = case.client(expected_pairs=pairs)
+
+    return measure(lambda: state["client"].build_secure_index(keywords_map, workers=case.options.get("workers", 1)),
+                   repeat, warmup, setup)
+
+def _bench_trapdoor(case: _Case, repeat: int, warmup: int) -> Dict[str, float]:
+    client, _ = case.index()
+    vocabulary = sorted(client.keyword_counts)
+    return measure(lambda: client.generate_trapdoors(vocabulary), repeat, warmup, client.trapdoor_cache.clear)
+
+def _bench_search(case: _Case, repeat: int, warmup: int) -> Dict[str, float]:
+    client, server = case.index()
+    keyword = case.options.get("keyword") or max(client.keyword_counts, key=client.keyword_counts.get)
+    trapdoor = client.generate_trapdoor(keyword)
+    return measure(lambda: server.search(trapdoor), repeat, warmup)
+
+def _bench_network(case: _Case, repeat: int, warmup: int) -> Dict[str, float]:
+    """
+    Times NETWORK_QUERIES searches pipelined over `connections` connections to a NetworkServer on localhost.
+    """
+    client, server = case.index()
+    keywords = sorted(client.keyword_counts, key=client.keyword_counts.get, reverse=True)[:NETWORK_KEYWORDS]
+    trapdoors = client.generate_trapdoors(keywords)
+    queries = case.options.get("queries", NETWORK_QUERIES)
+    batch = [trapdoors[i % len(trapdoors)] for i in range(queries)]
+
+    loop = asyncio.new_event_loop()
+    try:
+        network_server = loop.run_until_complete(NetworkServer(server).start())
+        remote = loop.run_until_complete(RemoteServer("127.0.0.1", network_server.port,
+                                                      case.options.get("connections", 1)).connect())
+        try:
+            stats = measure(lambda: loop.run_until_complete(remote.search_many(batch)), repeat, warmup)
+        finally:
+            loop.run_until_complete(remote.close())
+            loop.run_until_complete(network_server.close())
+    finally:
+        loop.close()
+    stats["queries_per_s"] = queries / stats["median"]
+    return stats
+
+BENCHMARKS = {
+    "generate": _bench_generate,
+    "encrypt": _bench_encrypt,
+    "build": _bench_build,
+    "trapdoor": _bench_trapdoor,
+    "search": _bench_search,
+    "network": _bench_network,
+}
+
+
+def run_suite(name: str, repeat: Optional[int] = None, warmup: Optional[int] = None, seed: int = SEED) -> List[dict]:
+    """
+    Runs every stage of a suite on every point of its grid and returns one record per (grid point, stage).
+    """
+    suite = SUITES[name]
+    repeat = suite.get("repeat", REPEAT) if repeat is None else repeat
+    warmup = suite.get("warmup", WARMUP) if warmup is None else warmup
+
+    records = []
+    for corpus in _grid(suite["corpus"]):
+        for options in _grid(suite["options"]):
+            case = _Case(suite["generator"], corpus, options, seed)
+            for stage in suite["stages"]:
+                stats = BENCHMARKS[stage](case, repeat, warmup)
+                record = {"suite": name, "stage": stage, "generator": suite["generator"], "corpus": corpus,
+                          "options": options, "repeat": repeat, "warmup": warmup, **stats}
+                throughput = "".join(f"  {key} {stats[key]:.1f}" for key in ("mb_per_s", "queries_per_s") if key in stats)
+                print(f"{name:<20} {stage:<9} {json.dumps({**corpus, **options}, sort_keys=True):<60} "
+                      f"min {stats['min']:.6f}s  median {stats['median']:.6f}s  p99 {stats['p99']:.6f}s{throughput}")
+                records.append(record)
+    return records
+
+def _key(record: dict) -> str:
+    return json.dumps([record["suite"], record["stage"], record["corpus"], record["options"]], sort_keys=True)
+
+def compare(records: List[dict], baseline: List[dict], tolerance: float = TOLERANCE) -> List[str]:
+    """
+    Returns a description of every record whose median is more than `tolerance` slower than the baseline.
+    Records without a baseline entry are not compared.
+    """
+    reference = {_key(record): record for record in baseline}
+    regressions = []
+    for record in records:
+        base = reference.get(_key(record))
+        if base is not None and record["median"] > base["median"] * (1 + tolerance):
+            regressions.append(f"{record['suite']}/{record['stage']} {json.dumps({**record['corpus'], **record['options']}, sort_keys=True)}: "
+                               f"median {record['median']:.6f}s vs baseline {base['median']:.6f}s "
+                               f"({(record['median'] / base['median'] - 1) * 100:+.1f}%)")
+    return regressions
+
+def _write(path: str, records: List[dict]):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": records,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES), help="suite to run (repeatable, default: quick)")
+    parser.add_argument("--repeat", type=int, help="timed runs per measurement (default: per suite)")
+    parser.add_argument("--warmup", type=int, help="untimed runs before the timed ones (default: per suite)")
+    parser.add_argument("--seed", type=int, default=SEED, help="seed of the generated corpora")
+    parser.add_argument("--output", default=RESULTS_FILE, help="JSON file receiving the results")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="JSON results to compare against (a regression fails the run)")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown of a median, as a fraction")
+    parser.add_argument("--save-baseline", metavar="PATH", help="also store the results as a new baseline")
+    args = parser.parse_args(argv)
+
+    suites = args.suite or ["quick"]
+    records = []
+    for name in suites:
+        records.extend(run_suite(name, args.repeat, args.warmup, args.seed))
+
+    _write(args.output, records)
+    print(f"\nResults saved to: {args.output}")
+    if args.save_baseline:
+        _write(args.save_baseline, records)
+        print(f"Baseline saved to: {args.save_baseline}")
+
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            # without a baseline no regression can be detected: only the quick suite may silently run without one
+            print(f"WARNING: no baseline at {args.baseline}, regressions cannot be detected "
+                  f"(create one with --save-baseline {args.baseline}, or skip the comparison with --baseline '')",
+                  file=sys.stderr)
+            return 1 if any(name != "quick" for name in suites) else 0
+        with open(args.baseline) as f:
+            regressions = compare(records, json.load(f)["results"], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"No regression against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
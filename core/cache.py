@@ -0,0 +1,49 @@
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Bounded mapping with least-recently-used eviction. The bound is a number of entries and, optionally, a total size
+    measured by `sizeof` (e.g. bytes of decrypted text); entries are evicted until both bounds hold.
+    """
+
+    def __init__(self, max_entries: int, max_size: Optional[int] = None, sizeof: Callable = len):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0  # total size of the cached values (tracked only when max_size is set)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default=None):
+        value = self.entries.get(key, default)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return value
+
+    def put(self, key: Hashable, value):
+        if self.max_size is not None:
+            if key in self.entries:
+                self.size -= self.sizeof(self.entries[key])
+            self.size += self.sizeof(value)
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries or (self.max_size is not None and self.size > self.max_size):
+            _, evicted = self.entries.popitem(last=False)
+            if self.max_size is not None:
+                self.size -= self.sizeof(evicted)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
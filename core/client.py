@@ -1,11 +1,29 @@
 import os
 import json
-from typing import Dict, List, Tuple
-from core.crypto import PRF, PRF_bytes, SKE_encrypt, SKE_decrypt
+import time
+from concurrent.futures import ProcessPoolExecutor
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple
+from core.cache import LRUCache
+from core.metrics import metrics
+from core.extractor import DEFAULT_EXTRACTOR, KeywordExtractor
+from core.crypto import (PRF, PRF_BYTES, PRF_MODE_PBKDF2, SKE_DECRYPT, SKE_ENCRYPT, SKE_MODE_CBC, SKE_MODE_CTR,
+                         FeistelPRP, SKE_encrypt, SKE_encrypt_ctr_batch)
+from core.node import NODE_FORMAT_BINARY, encode_node
+from core.segment import SegmentStore
+from core.sink import IndexSink, MemorySink
 from Crypto.Random import get_random_bytes
 
 INDEX_TABLE_SIZE = 500_009
+MAX_CAPACITY = 2 ** 32  # node pointers are 4 bytes
+T_ENTRY_SIZE = 20  # ⟨addr, K⟩: 4-byte address of the first node + 16-byte key
+T_LABEL_MASK = (1 << 64) - 1  # T is keyed by 64-bit labels π_{K3}(w), independent of its size
+TRAPDOOR_CACHE_SIZE = 10_000  # trapdoors kept in memory for repeated keywords
+DOCUMENT_CACHE_ENTRIES = 100_000  # entry bound of the decrypted-document cache (its size bound is set per client)
+PARALLEL_DECRYPT_MIN = 1_000  # fewer documents than this are decrypted in-process: a pool would cost more than it saves
+BUILD_CHUNK_NODES = 65_536  # nodes encrypted before they are handed to the sink (single-process build)
 ENCRYPTED_FOLDER = "data/encrypted_docs"
+SEGMENT_NAME = "documents"  # encrypted documents are packed in <folder>/documents.seg (+ .idx)
 
 def generate_symmetric_key(k: int = 16) -> bytes:
     """
@@ -13,161 +31,574 @@ def generate_symmetric_key(k: int = 16) -> bytes:
     """
     return get_random_bytes(k) # secure random key generation
 
+def _encrypt_documents(task) -> List[Tuple[str, bytes]]:
+    """
+    Encrypts a chunk of documents with K4. Runs in the client process or in a worker of the parallel bulk encryption.
+    In CTR mode the whole chunk shares one cipher setup (SKE_encrypt_ctr_batch); the other modes need a fresh IV or
+    nonce per document, so each document gets its own cipher object.
+
+    - Input: (document encryption mode, K4, [(doc_id, content), ...])
+    - Output: [(doc_id, ciphertext), ...] in input order
+    """
+    doc_mode, K4, documents = task
+    plaintexts = [content.encode() for _, content in documents]
+    if doc_mode == SKE_MODE_CTR:
+        ciphertexts = SKE_encrypt_ctr_batch(K4, plaintexts)
+    else:
+        encrypt = SKE_ENCRYPT[doc_mode]
+        ciphertexts = [encrypt(K4, plaintext) for plaintext in plaintexts]
+    return [(doc_id, ciphertext) for (doc_id, _), ciphertext in zip(documents, ciphertexts)]
+
+def _decrypt_documents(task) -> List[Tuple[str, str]]:
+    """
+    Decrypts a chunk of documents with K4 in a worker of the parallel decryption.
+
+    - Input: (document encryption mode, K4, [(doc_id, ciphertext), ...])
+    - Output: [(doc_id, plaintext), ...] in input order
+    """
+    doc_mode, K4, documents = task
+    decrypt = SKE_DECRYPT[doc_mode]
+    return [(doc_id, decrypt(K4, ciphertext).decode()) for doc_id, ciphertext in documents]
+
+def _encrypt_lists(task) -> List[Tuple[str, List[Tuple[int, bytes]], int, bytes, bytes]]:
+    """
+    Encrypts the linked lists of a group of keywords whose node addresses were already allocated.
+    Runs in the client process or in a worker of the parallel build, so it only depends on its arguments.
+
+    - Input: (node format, PRF mode, K2, K3, [(keyword, [(doc_id, doc_ref), ...], [addr, ...], tail), ...]) where tail is
+      the ⟨addr, K⟩ of the current head of the keyword's list, or None for a new keyword.
+    - Output: for each keyword, the keyword, its encrypted nodes [(addr, node), ...] in list order, the T index and
+      masked entry, and the key of the new first node.
+    """
+    node_format, prf_mode, K2, K3, lists = task
+    results = []
+
+    totals = {}  # per-operation call counts and times, when metrics are enabled (in the calling process only)
+    if metrics.enabled:
+        random_bytes = metrics.accumulate(totals, "random", get_random_bytes)
+        encode = metrics.accumulate(totals, "encode", encode_node)
+        encrypt = metrics.accumulate(totals, "aes", SKE_encrypt)
+        prf_bytes = metrics.accumulate(totals, "prf", PRF_BYTES[prf_mode])
+        prf = metrics.accumulate(totals, "prp", PRF)
+    else:
+        random_bytes, encode, encrypt, prf_bytes, prf = get_random_bytes, encode_node, SKE_encrypt, PRF_BYTES[prf_mode], PRF
+
+    for keyword, docs, addrs, tail in lists:
+        first_key = random_bytes(16)  # key used to encrypt the first node of the linked list (K_(i,0))
+        ki_prev = first_key  # initialize the chain with this key
+        nodes = []
+
+        for i, (doc_id, doc_ref) in enumerate(docs):
+            if i < len(docs) - 1:  # if it is not the last document
+                key_next = random_bytes(16)  # generate K_{i,j}: to be included in the current node and used to decrypt the next one
+                next_addr = addrs[i + 1]         # pseudo-random pointer to the next node
+            elif tail is not None:
+                next_addr, key_next = tail  # link the new segment to the existing list, whose nodes are left untouched
+            else:
+                key_next = b'0' * 16   # dummy key (0^k) since there is no next node to decrypt
+                next_addr = None       # marks the end of the linked list
+
+            node = encode(node_format, doc_id, doc_ref, key_next, next_addr)
+
+            # encrypt the current node using the previous key (K_{i,j-1})
+            nodes.append((addrs[i], encrypt(ki_prev, node)))
+
+            # prepare for next node
+            ki_prev = key_next
+
+        # concatenate the address and the key of the first node → ⟨addr, K⟩
+        entry_plain = addrs[0].to_bytes(4, 'big') + first_key
+
+        # generate a pseudo-random mask f_{K2}(w) to protect the lookup entry
+        # must use 20 bytes: the ⟨addr, K⟩ structure is 4 bytes (address) + 16 bytes (key), so the mask must match this size to apply XOR correctly
+        mask = prf_bytes(K2, keyword, length=T_ENTRY_SIZE)
+
+        # apply XOR byte-by-byte
+        masked_entry = bytes(a ^ b for a, b in zip(entry_plain, mask))
+
+        # compute the label π_{K3}(w) of this keyword in table T
+        index = prf(K3, keyword) & T_LABEL_MASK
+
+        results.append((keyword, nodes, index, masked_entry, first_key))
+
+    metrics.record("build", totals)
+    return results
+
 class Client:
-    def __init__(self):             
+    def __init__(self, node_format: str = NODE_FORMAT_BINARY, prf_mode: str = PRF_MODE_PBKDF2, expected_pairs: Optional[int] = None,
+                 doc_mode: str = SKE_MODE_CBC, document_cache_bytes: Optional[int] = None,
+                 extractor: KeywordExtractor = DEFAULT_EXTRACTOR, sink: Optional[IndexSink] = None):
         self.K1 = get_random_bytes(16)  # used to generate secure pointers for linked list in array A
         self.K2 = get_random_bytes(16)  # used to mask entries in the lookup table T
         self.K3 = get_random_bytes(16)  # used to compute secure indices for lookup in T
         self.K4 = generate_symmetric_key() # symmetric key used to encrypt/decrypt the documents
 
-        self.A = {} # encrypted linked list nodes (array A)
-        self.T = {} # lookup table
-        self.counter = 1 # counter used to generate unique addresses in A
-
-    def load_documents_and_keywords(self, folder="data/documents") -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+        self.node_format = node_format # serialization of the nodes in A (binary or legacy JSON)
+        self.prf_mode = prf_mode # PRF used for the masks f_{K2}(w): pbkdf2 (original), hmac or aes (fast modes)
+        self.trapdoor_cache = LRUCache(TRAPDOOR_CACHE_SIZE) # keyword → trapdoor, for repeated queries
+        self.doc_mode = doc_mode # AES mode of the document ciphertexts: cbc (original), ctr or gcm (no padding)
+        self.encryption_stats = {} # documents, ciphertext bytes, seconds and MB/s of the last encrypt_documents call
+        self.extractor = extractor # δ(D): fields of the documents that are indexed (the Disease line by default)
+        # decrypted documents, bounded by the total length of their text (disabled when document_cache_bytes is None)
+        self.document_cache = None if document_cache_bytes is None else LRUCache(DOCUMENT_CACHE_ENTRIES, document_cache_bytes)
+
+        # number of addresses of A: sized from the expected number of (w, id) pairs when known, grown on demand
+        self.capacity = INDEX_TABLE_SIZE if expected_pairs is None else max(expected_pairs, 1)
+
+        # destination of the encrypted index (array A and lookup table T), which the client does not keep itself
+        # unless the sink is the default MemorySink (see core.sink). It is only opened by the first build_secure_index
+        # (or open_sink), so creating a client neither resets a server nor connects to a remote one
+        self.sink = sink if sink is not None else MemorySink()
+        self.sink_open = False
+        # node addresses are ψ_{K1}(ctr) for a keyed permutation ψ, so distinct counters never collide. When A grows,
+        # a new epoch permutes the added slots [epoch_base, capacity) and existing addresses are left untouched
+        self.epoch = 0
+        self.epoch_base = 0
+        self.psi = FeistelPRP(self.K1, self.capacity, tweak=self.epoch)
+        self.counter = 0 # counter used to generate unique addresses in A (within the current epoch)
+
+        self.doc_ids = []  # doc-id table: binary nodes store the position of the document in this list
+        self.doc_refs = {} # reverse mapping doc id → position in doc_ids
+        self.keyword_counts = {} # keyword → length of its list, used by the query planner
+        self.heads = {} # keyword → ⟨addr, K⟩ of the first node of its list, where the next batch is linked in
+        self.labels = set() # T labels π_{K3}(w) already used, to detect label collisions without reading T back
+        self.state_lost = False # keys loaded without the build state: the index they belong to cannot be extended
+        self.segments = {}  # folder → segment file holding the encrypted documents written there
+
+    def save_keys(self, path: str):
+        """
+        Saves the client secret keys so that a later session can query an index reopened from a server snapshot,
+        together with the build state (address counter and epoch, list heads and lengths, doc-id table, T labels) that
+        lets it extend that index with new batches and plan multi-keyword queries.
+        The file is created readable by the owner only: the list heads hold node keys.
+        """
+        keys = {"K1": self.K1.hex(), "K2": self.K2.hex(), "K3": self.K3.hex(), "K4": self.K4.hex(), "prf_mode": self.prf_mode,
+                "doc_mode": self.doc_mode}
+        keys["state"] = {
+            "node_format": self.node_format,
+            "capacity": self.capacity,
+            "epoch": self.epoch,
+            "epoch_base": self.epoch_base,
+            "counter": self.counter,
+            "doc_ids": self.doc_ids,
+            "keyword_counts": self.keyword_counts,
+            "heads": {keyword: [addr, key.hex()] for keyword, (addr, key) in self.heads.items()},
+            "labels": list(self.labels),
+        }
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(keys, f)
+
+    def load_keys(self, path: str):
+        """
+        Restores the secret keys and the build state written by `save_keys`. Files written without the build state
+        (before it was saved) only allow searching: build_secure_index then raises instead of reusing node addresses.
+        """
+        with open(path) as f:
+            keys = json.load(f)
+        self.K1, self.K2, self.K3, self.K4 = (bytes.fromhex(keys[k]) for k in ("K1", "K2", "K3", "K4"))
+        self.prf_mode = keys.get("prf_mode", PRF_MODE_PBKDF2)
+        self.doc_mode = keys.get("doc_mode", SKE_MODE_CBC)
+
+        state = keys.get("state")
+        self.state_lost = state is None
+        if state is not None:
+            self.node_format = state["node_format"]
+            self.capacity = state["capacity"]
+            self.epoch = state["epoch"]
+            self.epoch_base = state["epoch_base"]
+            self.counter = state["counter"]
+            self.doc_ids = state["doc_ids"]
+            self.doc_refs = {doc_id: ref for ref, doc_id in enumerate(self.doc_ids)}
+            self.keyword_counts = state["keyword_counts"]
+            self.heads = {keyword: (addr, bytes.fromhex(key)) for keyword, (addr, key) in state["heads"].items()}
+            self.labels = set(state["labels"])
+        self.psi = FeistelPRP(self.K1, self.capacity - self.epoch_base, tweak=self.epoch)
+        self.trapdoor_cache.clear()
+
+    def load_documents_and_keywords(self, folder="data/documents", workers: int = 1) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
         """
         Loads the content of plaintext documents and extracts associated keywords. This corresponds to the δ(D) phase 
         in the SSE setup, where keywords are extracted from each document.
+        With workers > 1 the keywords are extracted in a process pool.
         """
 
         documents = {}       # stores the raw content of each document
         keywords_map = {}    # stores extracted keywords per document
 
-        for filename in os.listdir(folder): 
-            if filename.endswith(".txt"): 
-                path = os.path.join(folder, filename)
-                with open(path, "r", encoding="utf-8") as f:
-                    content = f.read()  # read full content of the document
-                    documents[filename] = content  # store it in the documents dict
-
-                    for line in content.splitlines():
-                        if line.lower().startswith("disease:"):
-                            value = line.split(":", 1)[1].strip()
-                            diseases = [d.strip().lower() for d in value.split(",")]
-                            keywords_map.setdefault(filename, []).extend(diseases)
+        def read():
+            for filename in os.listdir(folder):
+                if filename.endswith(".txt"):
+                    path = os.path.join(folder, filename)
+                    with open(path, "r", encoding="utf-8") as f:
+                        yield filename, f.read()  # read full content of the document
+
+        for filename, content, keywords in self.extractor.extract_all(read(), workers=workers):
+            documents[filename] = content  # store it in the documents dict
+            if keywords:
+                keywords_map[filename] = keywords
         
         # documents: {'doc1.txt': content, ...}
         # keywords_map: {'doc1.txt': ['cancer'], 'doc2.txt': ['diabetes']}
         return documents, keywords_map
 
-    def encrypt_documents(self, documents: Dict[str, str]) -> Dict[str, bytes]:
+    def extract_keywords(self, content: str) -> List[str]:
+        """
+        Extracts the keywords of a single document with the client's extractor (by default, the diseases listed on
+        its "Disease:" line).
+        """
+        return self.extractor.extract(content)
+
+    def encrypt_documents(self, documents: Dict[str, str], workers: int = 1) -> Dict[str, bytes]:
         """
         Encrypts all plaintext documents using the symmetric key K4
 
         - Input: a dictionary mapping document IDs to their plaintext content.
         - Output: a dictionary mapping the same document IDs to their encrypted content (as bytes).
+
+        With workers > 1 the documents are split into chunks of similar size in bytes and encrypted in a process pool.
+        The throughput of the call is recorded in encryption_stats.
         """
+        start = time.perf_counter()
+        items = list(documents.items())
+        total = sum(len(content) for _, content in items)
+
+        if workers > 1 and len(items) > 1:
+            # contiguous chunks of about total / (4 * workers) bytes, so results come back in input order
+            target = max(1, total // (workers * 4))
+            chunks, chunk, size = [], [], 0
+            for item in items:
+                chunk.append(item)
+                size += len(item[1])
+                if size >= target:
+                    chunks.append(chunk)
+                    chunk, size = [], 0
+            if chunk:
+                chunks.append(chunk)
+
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                tasks = [(self.doc_mode, self.K4, chunk) for chunk in chunks]
+                encrypted_documents = dict(result for chunk_results in pool.map(_encrypt_documents, tasks) for result in chunk_results)
+        else:
+            encrypted_documents = dict(_encrypt_documents((self.doc_mode, self.K4, items)))
+
+        seconds = time.perf_counter() - start
+        written = sum(len(ciphertext) for ciphertext in encrypted_documents.values())
+        self.encryption_stats = {
+            "documents": len(items),
+            "bytes": written,
+            "seconds": seconds,
+            "mb_per_s": written / seconds / 1e6 if seconds else 0.0,
+        }
+
+        segment = self._segment(ENCRYPTED_FOLDER)
+        segment.update(encrypted_documents)
+        segment.flush()
+        return encrypted_documents
 
-        os.makedirs(ENCRYPTED_FOLDER, exist_ok=True)
-        encrypted_documents = {}
+    def encrypt_document(self, content: str) -> bytes:
+        """
+        Encrypts a single plaintext document using the symmetric key K4
+        """
+        return SKE_ENCRYPT[self.doc_mode](self.K4, content.encode())
 
-        for doc_id, content in documents.items():
-            plaintext_bytes = content.encode()
-            encrypted = SKE_encrypt(self.K4, plaintext_bytes)
-            encrypted_documents[doc_id] = encrypted
+    def write_encrypted_document(self, doc_id: str, encrypted: bytes, folder: str = ENCRYPTED_FOLDER):
+        """
+        Appends an encrypted document to the segment file of <folder>. The write is buffered: call
+        flush_encrypted_documents once the batch is complete.
+        """
+        self._segment(folder)[doc_id] = encrypted
 
-            # Remove .txt before saving .enc
-            base_name = os.path.splitext(doc_id)[0]
-            file_path = os.path.join(ENCRYPTED_FOLDER, f"{base_name}.enc")
-            with open(file_path, "wb") as f:
-                f.write(encrypted)
+    def flush_encrypted_documents(self):
+        """
+        Writes the buffered encrypted documents of every open segment to disk.
+        """
+        for segment in self.segments.values():
+            segment.flush()
 
-        return encrypted_documents
+    @property
+    def A(self):
+        """
+        Array A as held by the sink: only in-process sinks (MemorySink, Server) have one.
+        """
+        return self.sink.A
+
+    @property
+    def T(self):
+        return self.sink.T
+
+    def open_sink(self):
+        """
+        Opens the sink for the index of this client; build_secure_index calls it on its first batch. A new client
+        starts an empty index (open_index), while a client restored by load_keys resumes the index the sink already
+        holds, e.g. a Server reopened from its snapshot (grow_index): it is neither reset nor uploaded again.
+        """
+        if self.sink_open:
+            return
+        if self.epoch == 0 and self.counter == 0:
+            self.sink.open_index(self.node_format, self.capacity, T_ENTRY_SIZE)
+        else:
+            self.sink.grow_index(self.capacity)
+        self.sink_open = True
+
+    def _segment(self, folder: str) -> SegmentStore:
+        if folder not in self.segments:
+            self.segments[folder] = SegmentStore(os.path.join(folder, SEGMENT_NAME))
+        return self.segments[folder]
     
-    def build_secure_index(self, keywords_map: Dict[str, List[str]]):
+    def build_secure_index(self, keywords_map: Dict[str, List[str]], workers: int = 1):
         """
         Builds the secure inverted index (A and T) based on the extracted keywords
+
+        The index can be extended batch by batch: the (w, id) pairs of a new batch form a segment that is linked in front
+        of the existing list of w, and only the T entry of w is rewritten. Existing nodes are never touched, so ingesting
+        N documents costs O(N) whatever the size of the index. A document can only be indexed once.
+
+        With workers > 1 the keyword lists are sharded across a process pool. Node addresses are still allocated here,
+        sequentially from the counter, so the layout stays collision-free and deterministic; the workers only do the
+        per-node work (key generation, serialization, AES) and the encrypted lists are handed to the sink.
+
+        A and T are emitted to the client's sink (core.sink) list by list as they are encrypted. The client only keeps
+        the allocation state (address counter and epoch, list heads and lengths, doc-id table), so with a sink other
+        than the default MemorySink its memory does not grow with the index.
+
+        Addresses come from a keyed permutation of the counter: one evaluation per node, no collisions, and no
+        occupancy check against A.
         """
 
         # this block inverts the original mapping from:
         # document_id → list of keywords to keyword → list of document_ids
         # example: "cancer": ["doc1.txt", "doc3.txt"]
+        if self.state_lost:
+            raise ValueError("The keys were loaded without the build state of their index: it cannot be extended")
+        already_indexed = [doc_id for doc_id in keywords_map if doc_id in self.doc_refs]
+        if already_indexed:
+            raise ValueError(f"Documents already indexed: {', '.join(already_indexed[:5])}")
+        self.open_sink()
+
         keyword_map = {}
         for doc_id, keywords in keywords_map.items():
+            self.doc_refs[doc_id] = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
             for keyword in keywords:
-                keyword_map.setdefault(keyword, []).append(doc_id)
-
-        # for each keyword, build an encrypted linked list
-        for keyword, doc_ids in keyword_map.items():
-            first_key = get_random_bytes(16)  # key used to encrypt the first node of the linked list (K_(i,0))
-            ki_prev = first_key  # initialize the chain with this key
-            addr_first = None  # will store the address of the first node (to be saved in T)
-            
-            for i, doc_id in enumerate(doc_ids):
-                ki = get_random_bytes(16)  # generate K_{i,j}: to be included in the current node and used to decrypt the next one
-
-                # generate a unique pseudo-random address for the current node
+                keyword_map.setdefault(keyword, []).append((doc_id, self.doc_refs[doc_id]))
+
+        with metrics.phase("build.allocate"):
+            # assign a unique pseudo-random address to every node of every list
+            remaining = sum(len(docs) for docs in keyword_map.values())
+            lists = []
+            for keyword, docs in keyword_map.items():
+                # nodes are chained in descending doc reference order, which lets the server merge lists as streams
+                docs.sort(key=lambda doc: doc[1], reverse=True)
+                self.keyword_counts[keyword] = self.keyword_counts.get(keyword, 0) + len(docs)
+
+                addrs = []
+                for _ in docs:
+                    if self.counter == self.capacity - self.epoch_base:
+                        self._grow(remaining)  # every address of the current epoch is taken
+                    addrs.append(self.epoch_base + self.psi.permute(self.counter))
+                    self.counter += 1
+                    remaining -= 1
+                lists.append((keyword, docs, addrs, self.heads.get(keyword)))
+
+        # encrypted lists are handed to the sink as soon as they are ready, so the client holds at most one chunk of
+        # ciphertexts (2 * workers shards with a process pool) and never the index itself
+        self.sink.begin_batch(list(keywords_map))  # before any node that refers to these documents
+        encrypted_chunks = self._encrypt_chunks(lists, workers)
+        while True:
+            with metrics.phase("build.encrypt"):
+                encrypted = next(encrypted_chunks, None)
+            if encrypted is None:
+                break
+            with metrics.phase("build.emit"):
+                for keyword, nodes, index, masked_entry, first_key in encrypted:
+                    if keyword not in self.heads and index in self.labels:
+                        raise ValueError(f"T label collision for keyword {keyword!r}")  # 64-bit labels: negligible, but never silent
+                    self.sink.store_nodes(nodes)  # encrypted nodes, at their pseudo-random addresses
+                    self.sink.store_entry(index, masked_entry)  # then the masked entry at the secure index
+                    self.labels.add(index)
+                    self.heads[keyword] = (nodes[0][0], first_key)
+        self.sink.commit_index()
+
+        metrics.count("build.documents", len(keywords_map))
+        metrics.count("build.keywords", len(lists))
+        metrics.count("build.nodes", sum(len(docs) for _, docs, _, _ in lists))
+
+    def _encrypt_chunks(self, lists, workers: int) -> Iterator[List[Tuple[str, List[Tuple[int, bytes]], int, bytes, bytes]]]:
+        """
+        Encrypts the allocated lists and yields the results chunk by chunk: chunks of about BUILD_CHUNK_NODES nodes
+        in-process, or the shards of a process pool in order. At most 2 * workers shards are submitted or finished and
+        not yet consumed, so a slow sink (e.g. a RemoteSink) throttles the pool instead of letting results pile up.
+        """
+        if workers > 1 and len(lists) > 1:
+            # balance the shards by number of nodes, largest lists first
+            shards = [[] for _ in range(min(workers * 4, len(lists)))]
+            sizes = [0] * len(shards)
+            for item in sorted(lists, key=lambda item: len(item[1]), reverse=True):
+                target = sizes.index(min(sizes))
+                shards[target].append(item)
+                sizes[target] += len(item[1])
+
+            shards = iter(shards)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = []
                 while True:
-                    addr = PRF(self.K1, str(self.counter)) % INDEX_TABLE_SIZE
-                    if addr not in self.A:
-                        break
-                    self.counter += 1  # skip to next counter if address already used
-
-                if i < len(doc_ids) - 1:  # if it is not the last document
-                    # generate a unique next node address
-                    temp_counter = self.counter + 1
-                    while True:
-                        next_addr = PRF(self.K1, str(temp_counter)) % INDEX_TABLE_SIZE
-                        if next_addr not in self.A:
+                    while len(pending) < 2 * workers:
+                        shard = next(shards, None)
+                        if shard is None:
                             break
-                        temp_counter += 1
-                    next_ptr = next_addr.to_bytes(4, 'big')  # pseudo-random pointer to the next node
-                    key_next = ki  # key to decrypt the next node
-                    ptr_hex = next_ptr.hex()
-                else:
-                    key_next = b'0' * 16   # dummy key (0^k) since there is no next node to decrypt
-                    ptr_hex = "NULL"       # marks the end of the linked list
-
-                node = {
-                    "id": doc_id,           # id(Di,j )
-                    "k": key_next.hex(),    # key to decrypt the next node (K_{i,j}) in hex format
-                    "ptr": ptr_hex          # pointer to the next node
-                }
-
-                # encrypt the current node using the previous key (K_{i,j-1}) and store it in A
-                encrypted_node = SKE_encrypt(ki_prev, json.dumps(node).encode())
-                self.A[addr] = encrypted_node  # store encrypted node at pseudo-random address
-
-                if addr_first is None:
-                    addr_first = addr  # store address of first node for table T
-
-                # prepare for next node
-                ki_prev = ki
-                self.counter += 1
-
-            # convert the first node's address to 4 bytes
-            address_bytes = addr_first.to_bytes(4, 'big')
-
-            # concatenate the address and the key of the first node → ⟨addr, K⟩
-            entry_plain = address_bytes + first_key
-
-            # generate a pseudo-random mask f_{K2}(w) to protect the lookup entry
-            # must use 20 bytes: the ⟨addr, K⟩ structure is 4 bytes (address) + 16 bytes (key), so the mask must match this size to apply XOR correctly
-            mask = PRF_bytes(self.K2, keyword, length=20)
-
-            # apply XOR byte-by-byte
-            masked_entry = bytes(a ^ b for a, b in zip(entry_plain, mask))
-
-            # compute the index π_{K3}(w) for this keyword in table T
-            index = PRF(self.K3, keyword) % INDEX_TABLE_SIZE
-
-            # store the masked entry in T at the secure index
-            self.T[index] = masked_entry
-
+                        pending.append(pool.submit(_encrypt_lists, (self.node_format, self.prf_mode, self.K2, self.K3, shard)))
+                    if not pending:
+                        return
+                    yield pending.pop(0).result()
+
+        chunk, nodes = [], 0
+        for item in lists:
+            chunk.append(item)
+            nodes += len(item[1])
+            if nodes >= BUILD_CHUNK_NODES:
+                yield _encrypt_lists((self.node_format, self.prf_mode, self.K2, self.K3, chunk))
+                chunk, nodes = [], 0
+        if chunk:
+            yield _encrypt_lists((self.node_format, self.prf_mode, self.K2, self.K3, chunk))
+
+    def _grow(self, pairs: int):
+        """
+        Opens a new address epoch when the current one is exhausted: A grows by at least `pairs` slots (doubling by
+        default) and the new slots are addressed by a fresh permutation ψ_{K1, epoch}. Existing nodes keep their
+        address, so the pointers to them stay valid and nothing has to be re-encrypted.
+        """
+        size = max(self.capacity, pairs)
+        if self.capacity + size > MAX_CAPACITY:
+            size = MAX_CAPACITY - self.capacity
+            if size < pairs:
+                raise ValueError(f"The index cannot address {pairs} more nodes with 4-byte pointers")
+
+        metrics.count("build.epochs")
+        self.epoch += 1
+        self.epoch_base = self.capacity
+        self.capacity += size
+        self.psi = FeistelPRP(self.K1, size, tweak=self.epoch)
+        self.counter = 0
+        self.sink.grow_index(self.capacity)
 
     def generate_trapdoor(self, keyword: str) -> Tuple[int, bytes]:
         """
         Generates a secure trapdoor for a given keyword w. This trapdoor allows the server to recover the address and decryption 
         key for the first node in A associated with the queried keyword, without learning the keyword itself.
         """
-        
-        index = PRF(self.K3, keyword) % INDEX_TABLE_SIZE # compute π_{K3}(w): secure index in the T table for the given keyword
-        mask = PRF_bytes(self.K2, keyword, length=20) # compute f_{K2}(w): mask used to unmask the T[π_{K3}(w)] entry
+        trapdoor = self.trapdoor_cache.get(keyword)
+        if trapdoor is not None:
+            metrics.count("trapdoor.cache_hits")
+            return trapdoor
+        metrics.count("trapdoor.cache_misses")
+
+        index = PRF(self.K3, keyword) & T_LABEL_MASK # compute π_{K3}(w): secure label of the T entry for the given keyword
+        mask = PRF_BYTES[self.prf_mode](self.K2, keyword, length=T_ENTRY_SIZE) # compute f_{K2}(w): mask used to unmask the T[π_{K3}(w)] entry
+
+        trapdoor = (index, mask) # the trapdoor t = (index, mask) used for secure search
+        self.trapdoor_cache.put(keyword, trapdoor)
+        return trapdoor
+
+    def generate_trapdoors(self, keywords: List[str]) -> List[Tuple[int, bytes]]:
+        """
+        Generates the trapdoors of several keywords at once, in input order. Repeated keywords (within the batch or
+        across calls) are served from the in-process trapdoor cache.
+        """
+        return [self.generate_trapdoor(keyword) for keyword in keywords]
 
-        return index, mask # return the trapdoor t = (index, mask) used for secure search
+    def plan_query(self, keywords: List[str]) -> List[Tuple[int, bytes]]:
+        """
+        Query planner for multi-keyword searches (Server.search_and / search_or): returns the trapdoors ordered from
+        the shortest to the longest list, using the list lengths known to the client from index construction.
+        Keywords that were never indexed come first, so a conjunction containing one is answered without any traversal.
+        """
+        ordered = sorted(dict.fromkeys(keywords), key=lambda keyword: self.keyword_counts.get(keyword, 0))
+        return self.generate_trapdoors(ordered)
 
     def decrypt_document(self, ciphertext: bytes) -> str:
         """ 
         Decrypt a document using the symmetric key K4
         """
-        return SKE_decrypt(self.K4, ciphertext).decode()
+        return SKE_DECRYPT[self.doc_mode](self.K4, ciphertext).decode()
+
+    def decrypt_documents(self, ciphertexts: Mapping, workers: int = 1, lazy: bool = False) -> Mapping:
+        """
+        Decrypts a set of search results given as a mapping doc id → ciphertext (e.g. a dict built from
+        server.documents) and returns a mapping doc id → plaintext.
+
+        - lazy=True returns a DecryptedDocuments view that decrypts a document only when it is accessed.
+        - otherwise the documents are decrypted at once, in a process pool when workers > 1 and at least
+          PARALLEL_DECRYPT_MIN documents need decrypting.
+        Documents found in the decrypted-document cache are not decrypted again in either case.
+        """
+        if lazy:
+            return DecryptedDocuments(self, ciphertexts)
+
+        decrypted = {}
+        pending = []
+        for doc_id, ciphertext in ciphertexts.items():
+            text = self._cached_document(doc_id, ciphertext)
+            if text is None:
+                pending.append((doc_id, ciphertext))
+            decrypted[doc_id] = text
+
+        if workers > 1 and len(pending) >= PARALLEL_DECRYPT_MIN:
+            # ciphertexts may be views of a segment or snapshot mapping: copy them to bytes to send them to the workers
+            size = -(-len(pending) // (workers * 4))
+            tasks = [(self.doc_mode, self.K4, [(doc_id, bytes(ciphertext)) for doc_id, ciphertext in pending[i:i + size]])
+                     for i in range(0, len(pending), size)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = [result for chunk_results in pool.map(_decrypt_documents, tasks) for result in chunk_results]
+        else:
+            results = _decrypt_documents((self.doc_mode, self.K4, pending))
+
+        for (doc_id, text), (_, ciphertext) in zip(results, pending):
+            decrypted[doc_id] = text
+            self._cache_document(doc_id, ciphertext, text)
+        return decrypted
+
+    def _cached_document(self, doc_id: str, ciphertext: bytes) -> Optional[str]:
+        if self.document_cache is None:
+            return None
+        # the leading IV/nonce is fresh for every encryption, so a re-encrypted document never hits a stale entry
+        return self.document_cache.get((doc_id, bytes(ciphertext[:16])))
+
+    def _cache_document(self, doc_id: str, ciphertext: bytes, text: str):
+        if self.document_cache is not None:
+            self.document_cache.put((doc_id, bytes(ciphertext[:16])), text)
+
+
+class DecryptedDocuments(Mapping):
+    """
+    Lazy view doc id → plaintext over a mapping of ciphertexts: a document is fetched and decrypted the first time it
+    is accessed (through the client's document cache when enabled, otherwise memoized in the view), so paging
+    through a large result set only decrypts the pages that are displayed.
+    """
+
+    def __init__(self, client: Client, ciphertexts: Mapping):
+        self.client = client
+        self.ciphertexts = ciphertexts
+        self.decrypted = {}  # documents decrypted through this view when the client has no document cache
+
+    def __getitem__(self, doc_id: str) -> str:
+        if doc_id in self.decrypted:
+            return self.decrypted[doc_id]
+        ciphertext = self.ciphertexts[doc_id]
+        text = self.client._cached_document(doc_id, ciphertext)
+        if text is None:
+            text = self.client.decrypt_document(ciphertext)
+            if self.client.document_cache is not None:
+                self.client._cache_document(doc_id, ciphertext, text)
+            else:
+                self.decrypted[doc_id] = text
+        return text
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self.ciphertexts
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ciphertexts)
+
+    def __len__(self) -> int:
+        return len(self.ciphertexts)
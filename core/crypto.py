@@ -1,4 +1,6 @@
+import hmac
 import hashlib
+from typing import List
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
 
@@ -22,11 +24,96 @@ def SKE_decrypt(key: bytes, ciphertext: bytes) -> bytes:
     """
     Performs symmetric decryption using AES in CBC mode (SKE2 decryption step).
     """
+    if isinstance(ciphertext, memoryview):
+        ciphertext = ciphertext.tobytes()  # PyCryptodome handles bytes much faster than buffer views, and nodes are small
     iv = ciphertext[:16]
     ct = ciphertext[16:]
     cipher = AES.new(key, AES.MODE_CBC, iv)
     return unpad(cipher.decrypt(ct))
 
+def SKE_encrypt_ctr(key: bytes, plaintext: bytes) -> bytes:
+    """
+    Symmetric encryption using AES in CTR mode: no padding, and the keystream blocks are independent.
+    Output: 8-byte nonce || 8-byte initial counter || ciphertext.
+    """
+    return SKE_encrypt_ctr_batch(key, [plaintext])[0]
+
+CTR_BATCH_CHUNK = 64 * 1024  # bytes of plaintext encrypted per AES call by SKE_encrypt_ctr_batch
+
+def SKE_encrypt_ctr_batch(key: bytes, plaintexts: List[bytes]) -> List[bytes]:
+    """
+    Encrypts many plaintexts in CTR mode with a single cipher setup: they share one random nonce and each one starts
+    at the first unused counter block, so no (nonce, counter) block is used twice. Small plaintexts are concatenated
+    (block-aligned) into chunks of about CTR_BATCH_CHUNK bytes encrypted with one AES call each.
+    Ciphertexts keep the exact plaintext length (no padding).
+    """
+    cipher = AES.new(key, AES.MODE_CTR, nonce=get_random_bytes(8), initial_value=0)
+    ciphertexts = []
+    buffer = bytearray()
+    pending = []  # (start block, position in buffer, length) of the plaintexts in buffer
+    block = 0
+
+    def flush():
+        stream = cipher.encrypt(buffer)
+        for start, pos, length in pending:
+            ciphertexts.append(cipher.nonce + start.to_bytes(8, 'big') + stream[pos:pos + length])
+        buffer.clear()
+        pending.clear()
+
+    for plaintext in plaintexts:
+        pending.append((block, len(buffer), len(plaintext)))
+        buffer += plaintext
+        buffer += bytes(-len(plaintext) % 16)
+        block += -(-len(plaintext) // 16)
+        if len(buffer) >= CTR_BATCH_CHUNK:
+            flush()
+    if pending:
+        flush()
+    return ciphertexts
+
+def SKE_decrypt_ctr(key: bytes, ciphertext: bytes) -> bytes:
+    """
+    Decryption of SKE_encrypt_ctr ciphertexts.
+    """
+    if isinstance(ciphertext, memoryview):
+        ciphertext = ciphertext.tobytes()
+    cipher = AES.new(key, AES.MODE_CTR, nonce=ciphertext[:8], initial_value=ciphertext[8:16])
+    return cipher.decrypt(ciphertext[16:])
+
+def SKE_encrypt_gcm(key: bytes, plaintext: bytes) -> bytes:
+    """
+    Authenticated symmetric encryption using AES in GCM mode (CTR encryption plus a GHASH tag).
+    Output: 12-byte nonce || ciphertext || 16-byte tag.
+    """
+    cipher = AES.new(key, AES.MODE_GCM, nonce=get_random_bytes(12))
+    ct, tag = cipher.encrypt_and_digest(plaintext)
+    return cipher.nonce + ct + tag
+
+def SKE_decrypt_gcm(key: bytes, ciphertext: bytes) -> bytes:
+    """
+    Decryption of SKE_encrypt_gcm ciphertexts. Raises ValueError when the ciphertext was modified.
+    """
+    if isinstance(ciphertext, memoryview):
+        ciphertext = ciphertext.tobytes()
+    cipher = AES.new(key, AES.MODE_GCM, nonce=ciphertext[:12])
+    return cipher.decrypt_and_verify(ciphertext[12:-16], ciphertext[-16:])
+
+SKE_MODE_CBC = "cbc"  # SKE_encrypt: AES-CBC with PKCS#7 padding (original construction)
+SKE_MODE_CTR = "ctr"  # SKE_encrypt_ctr: AES-CTR, no padding
+SKE_MODE_GCM = "gcm"  # SKE_encrypt_gcm: AES-GCM, no padding, authenticated
+
+SKE_ENCRYPT = {
+    SKE_MODE_CBC: SKE_encrypt,
+    SKE_MODE_CTR: SKE_encrypt_ctr,
+    SKE_MODE_GCM: SKE_encrypt_gcm,
+}
+
+SKE_DECRYPT = {
+    SKE_MODE_CBC: SKE_decrypt,
+    SKE_MODE_CTR: SKE_decrypt_ctr,
+    SKE_MODE_GCM: SKE_decrypt_gcm,
+}
+
 def PRF(key: bytes, data: str) -> int:
     """
     PRF: pseudo-random function based on SHA-256. This is used in the SSE scheme 
@@ -47,3 +134,72 @@ def PRF_bytes(key: bytes, data: str, length: int = 16) -> bytes:
     1000,             # number of times the hash function is applied during key derivation
     dklen=length      # desired output length in bytes
     )
+
+def PRF_bytes_hmac(key: bytes, data: str, length: int = 16) -> bytes:
+    """
+    Fast PRF producing a pseudo-random byte string of fixed length with a single HMAC-SHA256 pass per 32 output bytes
+    (HMAC(key, counter || data) for counter = 0, 1, ...), instead of the 1000 iterations of PRF_bytes.
+    """
+    data = data.encode()
+    out = b""
+    for counter in range(-(-length // 32)):
+        out += hmac.digest(key, counter.to_bytes(4, 'big') + data, 'sha256')
+    return out[:length]
+
+def PRF_bytes_aes(key: bytes, data: str, length: int = 16) -> bytes:
+    """
+    AES-based PRF: the input is compressed with SHA-256 and the blocks H(data)[:12] || counter are encrypted
+    with AES under the key in a single ECB call (one block per 16 output bytes).
+    """
+    digest = hashlib.sha256(data.encode()).digest()[:12]
+    blocks = b"".join(digest + counter.to_bytes(4, 'big') for counter in range(-(-length // 16)))
+    return AES.new(key, AES.MODE_ECB).encrypt(blocks)[:length]
+
+PRF_MODE_PBKDF2 = "pbkdf2"  # PRF_bytes: PBKDF2-HMAC-SHA256 with 1000 iterations (original construction)
+PRF_MODE_HMAC = "hmac"      # PRF_bytes_hmac: single-pass HMAC-SHA256
+PRF_MODE_AES = "aes"        # PRF_bytes_aes: SHA-256 compression + AES-ECB
+
+PRF_BYTES = {
+    PRF_MODE_PBKDF2: PRF_bytes,
+    PRF_MODE_HMAC: PRF_bytes_hmac,
+    PRF_MODE_AES: PRF_bytes_aes,
+}
+
+FEISTEL_ROUNDS = 4
+
+class FeistelPRP:
+    """
+    Keyed small-domain pseudo-random permutation ψ_K over [0, domain): a balanced Feistel network on the smallest
+    even number of bits covering the domain (keyed BLAKE2b round functions), with cycle walking to stay inside it.
+    The tweak separates independent permutations derived from the same key.
+
+    Node pointers are 4 bytes, so each half is at most 16 bits: the round functions are tabulated once
+    (at most 2^16 entries per round) and evaluating ψ costs a few table lookups.
+    """
+
+    def __init__(self, key: bytes, domain: int, tweak: int = 0, rounds: int = FEISTEL_ROUNDS):
+        bits = max(2, (domain - 1).bit_length())
+        bits += bits & 1
+        self.domain = domain
+        self.half = bits // 2
+        self.mask = (1 << self.half) - 1
+
+        self.tables = []
+        for i in range(rounds):
+            round_function = hashlib.blake2b(key=key, digest_size=8, salt=tweak.to_bytes(8, 'big') + i.to_bytes(8, 'big'))
+            table = []
+            for right in range(1 << self.half):
+                h = round_function.copy()
+                h.update(right.to_bytes(4, 'big'))
+                table.append(int.from_bytes(h.digest(), 'big') & self.mask)
+            self.tables.append(table)
+
+    def permute(self, x: int) -> int:
+        half, mask = self.half, self.mask
+        while True:
+            left, right = x >> half, x & mask
+            for table in self.tables:
+                left, right = right, left ^ table[right]
+            x = (left << half) | right
+            if x < self.domain:  # cycle walking: the Feistel domain is less than 4x the target domain
+                return x
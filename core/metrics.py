@@ -0,0 +1,220 @@
+import io
+import json
+import time
+import bisect
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+# Upper bounds of the histogram buckets (an implicit +Inf bucket follows the last one)
+TIME_BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, 10.0, 100.0)  # seconds
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536)  # nodes, kicks, ...
+PROMETHEUS_PREFIX = "sse_"
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus model: count, sum, min, max and a count per upper bound.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # the last slot is the +Inf bucket
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.sum / self.count if self.count else None,
+            "buckets": {str(bound): count for bound, count in zip(self.bounds + ("+Inf",), self.counts)},
+        }
+
+
+class Metrics:
+    """
+    Counters, timers and histograms for the hot paths of Client and Server (PRF evaluations, AES, node traversal,
+    T insertions, ...). Recording is off by default: instrumented code checks `enabled` before reading the clock,
+    so a disabled registry costs one attribute lookup per instrumented call.
+
+    Timers are histograms of durations in seconds; `phase` times a block and `add_time` records a duration measured
+    by the caller (used to accumulate per-node costs and record them once per call). Only the process that
+    records the values sees them: work done in the process pools of the parallel build is not broken down.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def count(self, name: str, value: int = 1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = COUNT_BUCKETS):
+        if self.enabled:
+            with self._lock:
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram(buckets)
+                histogram.observe(value)
+
+    def add_time(self, name: str, seconds: float):
+        self.observe(name + ".seconds", seconds, TIME_BUCKETS)
+
+    @staticmethod
+    def accumulate(totals: Dict[str, list], name: str, fn: Callable) -> Callable:
+        """
+        Wraps fn so that each call adds to totals[name] = [calls, seconds]. Used for operations too cheap and too
+        frequent to record one by one (PRF, AES, key generation per node); see `record`.
+        """
+        totals[name] = [0, 0.0]
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                entry = totals[name]
+                entry[0] += 1
+                entry[1] += time.perf_counter() - start
+        return timed
+
+    def record(self, prefix: str, totals: Dict[str, list]):
+        """
+        Records the totals gathered with `accumulate`: a call counter and a timer observation per operation.
+        """
+        for name, (calls, seconds) in totals.items():
+            self.count(f"{prefix}.{name}.calls", calls)
+            self.add_time(f"{prefix}.{name}", seconds)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+            }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_prometheus(self, prefix: str = PROMETHEUS_PREFIX) -> str:
+        """
+        Renders the metrics in the Prometheus text exposition format (dots in names become underscores).
+        """
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = prefix + name.replace(".", "_") + "_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value}")
+            for name, histogram in sorted(self.histograms.items()):
+                metric = prefix + name.replace(".", "_")
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.bounds + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f"{metric}_sum {histogram.sum}")
+                lines.append(f"{metric}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()  # registry used by Client, Server and the index structures
+
+
+class Capture:
+    """
+    Result of a profile() block: the cProfile statistics and/or the tracemalloc peak and top allocations.
+    """
+
+    def __init__(self):
+        self.profile: Optional[cProfile.Profile] = None
+        self.peak_memory: Optional[int] = None  # bytes
+        self.top_allocations: List[str] = []
+
+    def report(self, limit: int = 20, sort: str = "cumulative") -> str:
+        out = io.StringIO()
+        if self.profile is not None:
+            pstats.Stats(self.profile, stream=out).sort_stats(sort).print_stats(limit)
+        if self.peak_memory is not None:
+            out.write(f"Peak traced memory: {self.peak_memory / 1e6:.2f} MB\n")
+            for line in self.top_allocations[:limit]:
+                out.write(line + "\n")
+        return out.getvalue()
+
+
+@contextmanager
+def profile(cpu: bool = True, memory: bool = False, output: Optional[str] = None, memory_frames: int = 1) -> Iterator[Capture]:
+    """
+    Captures a single build or query:
+
+        with profile(memory=True) as capture:
+            client.build_secure_index(keywords_map)
+        print(capture.report())
+
+    cpu=True runs the block under cProfile (its statistics are dumped to `output` when given, for pstats or
+    snakeviz); memory=True traces allocations with tracemalloc and records the peak and the top allocation sites.
+    Both slow the block down considerably, so timings taken inside a capture are not representative.
+    """
+    capture = Capture()
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(memory_frames)
+    if memory:
+        tracemalloc.reset_peak()
+    profiler = cProfile.Profile() if cpu else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield capture
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            capture.profile = profiler
+            if output is not None:
+                profiler.dump_stats(output)
+        if memory:
+            _, capture.peak_memory = tracemalloc.get_traced_memory()
+            capture.top_allocations = [str(stat) for stat in tracemalloc.take_snapshot().statistics("lineno")]
+            if started_tracing:
+                tracemalloc.stop()
@@ -0,0 +1,544 @@
+import asyncio
+import itertools
+import socket
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Mapping, Optional, Tuple
+from core.client import T_ENTRY_SIZE, Client
+from core.server import Server
+
+# Every message is a frame: FRAME (payload length, opcode, request id) | payload.
+# A response carries the request id of its request, so a connection can have many requests in flight (pipelining)
+# and the server answers them in completion order rather than arrival order.
+#
+# Payloads (big-endian):
+#   SEARCH      TRAPDOOR
+#   SEARCH_AND  u32 limit | u32 n | n × TRAPDOOR   (same for SEARCH_OR; limit NO_LIMIT means no limit)
+#   FETCH       u32 n | n × (u16 length | utf-8 doc id)
+#   RESULTS     u32 n | n × (u16 length | utf-8 doc id)
+#   DOCUMENTS   u32 n | n × (u16 length | utf-8 doc id | u32 length | ciphertext), length MISSING for unknown ids
+#   ERROR       utf-8 message
+#
+# Index upload (RemoteSink → NetworkServer with accept_uploads=True), each answered by an empty OK:
+#   INDEX_OPEN    INDEX_OPEN (capacity, entry size) | utf-8 node format
+#   INDEX_GROW    u64 capacity
+#   INDEX_NODES   u32 n | n × (u32 addr | u32 length | node)
+#   INDEX_ENTRIES u32 n | n × ENTRY
+#   INDEX_COMMIT  u32 n | n × (u16 length | utf-8 doc id)
+#   STORE         same payload as DOCUMENTS
+# Uploads of a connection are executed one at a time in arrival order, so a T entry never precedes its nodes.
+FRAME = struct.Struct(">IBI")
+TRAPDOOR = struct.Struct(f">Q{T_ENTRY_SIZE}s")  # ⟨π_{K3}(w), f_{K2}(w)⟩
+ENTRY = struct.Struct(f">Q{T_ENTRY_SIZE}s")     # ⟨π_{K3}(w), masked ⟨addr, K⟩⟩
+INDEX_OPEN = struct.Struct(">QI")
+CAPACITY = struct.Struct(">Q")
+NODE = struct.Struct(">II")
+COUNT = struct.Struct(">I")
+STRING = struct.Struct(">H")
+BLOB = struct.Struct(">I")
+
+OP_SEARCH = 1
+OP_SEARCH_AND = 2
+OP_SEARCH_OR = 3
+OP_FETCH = 4
+OP_INDEX_OPEN = 5
+OP_INDEX_GROW = 6
+OP_INDEX_NODES = 7
+OP_INDEX_ENTRIES = 8
+OP_INDEX_COMMIT = 9
+OP_STORE = 10
+OP_INDEX_BEGIN = 11
+OP_OK = 0x80
+OP_RESULTS = 0x81
+OP_DOCUMENTS = 0x82
+OP_ERROR = 0xFF
+
+NO_LIMIT = 0xFFFFFFFF
+MISSING = 0xFFFFFFFF
+MAX_FRAME = 64 * 1024 * 1024  # largest payload accepted from the peer
+PIPELINE_DEPTH = 128          # requests in flight per connection before the server stops reading from it
+NETWORK_WORKERS = 8           # threads running searches, so a long search does not delay the ones behind it
+UPLOAD_OPCODES = frozenset((OP_INDEX_OPEN, OP_INDEX_GROW, OP_INDEX_BEGIN, OP_INDEX_NODES, OP_INDEX_ENTRIES, OP_INDEX_COMMIT,
+                            OP_STORE))
+UPLOAD_BATCH_BYTES = 1024 * 1024  # nodes, entries or documents buffered by RemoteSink before they are sent
+UPLOAD_WINDOW = 32                # upload frames sent by RemoteSink before it waits for their acknowledgements
+
+
+class RemoteError(Exception):
+    """
+    Raised by the client stub when the server answered a request with an ERROR frame.
+    """
+
+
+def _pack_strings(values: List[str]) -> bytes:
+    parts = [COUNT.pack(len(values))]
+    for value in values:
+        encoded = value.encode()
+        parts.append(STRING.pack(len(encoded)))
+        parts.append(encoded)
+    return b"".join(parts)
+
+def _unpack_strings(payload: bytes, pos: int = 0) -> Tuple[List[str], int]:
+    n, = COUNT.unpack_from(payload, pos)
+    pos += COUNT.size
+    values = []
+    for _ in range(n):
+        length, = STRING.unpack_from(payload, pos)
+        pos += STRING.size
+        values.append(bytes(payload[pos:pos + length]).decode())
+        pos += length
+    return values, pos
+
+def _pack_trapdoors(trapdoors: List[Tuple[int, bytes]]) -> bytes:
+    return COUNT.pack(len(trapdoors)) + b"".join(TRAPDOOR.pack(index, bytes(mask)) for index, mask in trapdoors)
+
+def _unpack_trapdoors(payload: bytes, pos: int = 0) -> List[Tuple[int, bytes]]:
+    n, = COUNT.unpack_from(payload, pos)
+    pos += COUNT.size
+    return [TRAPDOOR.unpack_from(payload, pos + i * TRAPDOOR.size) for i in range(n)]
+
+def _pack_documents(documents: List[Tuple[str, Optional[bytes]]]) -> bytes:
+    parts = [COUNT.pack(len(documents))]
+    for doc_id, ciphertext in documents:
+        encoded = doc_id.encode()
+        parts.append(STRING.pack(len(encoded)))
+        parts.append(encoded)
+        if ciphertext is None:
+            parts.append(BLOB.pack(MISSING))
+        else:
+            parts.append(BLOB.pack(len(ciphertext)))
+            parts.append(ciphertext)
+    return b"".join(parts)
+
+def _unpack_documents(payload: bytes) -> Dict[str, bytes]:
+    n, = COUNT.unpack_from(payload, 0)
+    pos = COUNT.size
+    documents = {}
+    for _ in range(n):
+        length, = STRING.unpack_from(payload, pos)
+        pos += STRING.size
+        doc_id = bytes(payload[pos:pos + length]).decode()
+        pos += length
+        length, = BLOB.unpack_from(payload, pos)
+        pos += BLOB.size
+        if length != MISSING:
+            documents[doc_id] = bytes(payload[pos:pos + length])
+            pos += length
+    return documents
+
+async def _read_frame(reader: asyncio.StreamReader) -> Optional[Tuple[int, int, bytes]]:
+    """
+    Reads one frame and returns (opcode, request id, payload), or None when the peer closed the connection.
+    """
+    try:
+        header = await reader.readexactly(FRAME.size)
+    except asyncio.IncompleteReadError:
+        return None
+    length, opcode, request_id = FRAME.unpack(header)
+    if length > MAX_FRAME:
+        raise ValueError(f"Frame of {length} bytes exceeds the limit of {MAX_FRAME}")
+    payload = await reader.readexactly(length)
+    return opcode, request_id, payload
+
+
+class NetworkServer:
+    """
+    asyncio TCP front end of a Server. Each connection is long-lived and pipelined: requests are read as they
+    arrive and executed on a shared thread pool, so the event loop never blocks on a search and searches from
+    different connections (or from the same one) are interleaved. List traversal and per-node decryption are
+    Python-bound and hold the GIL, so the pool adds concurrency, not throughput: the `network` benchmark suite
+    measures about the same queries/s at 1 and 16 connections as serial in-process search. A connection stops being
+    read once PIPELINE_DEPTH of its requests are in flight. A response larger than MAX_FRAME is replaced by an ERROR
+    frame, which the peer would otherwise treat as a broken connection and fail all its pending requests.
+
+    With accept_uploads=True the server also accepts an index streamed by a RemoteSink, which replaces the index it
+    serves. Any peer can then upload, so only enable it where the data owner is the only one who can connect.
+    """
+
+    def __init__(self, server: Server, host: str = "127.0.0.1", port: int = 0, workers: int = NETWORK_WORKERS,
+                 accept_uploads: bool = False):
+        self.server = server
+        self.host = host
+        self.port = port  # 0 picks a free port, available here once start() returns
+        self.workers = workers
+        self.accept_uploads = accept_uploads
+        self._executor = None
+        self._listener = None
+
+    async def start(self) -> "NetworkServer":
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._listener = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._listener.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self._listener is None:
+            await self.start()
+        await self._listener.serve_forever()
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.close()
+            await self._listener.wait_closed()
+            self._listener = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def __aenter__(self) -> "NetworkServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        in_flight = asyncio.Semaphore(PIPELINE_DEPTH)
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                await in_flight.acquire()
+                frame = await _read_frame(reader)
+                if frame is None:
+                    break
+                if frame[0] in UPLOAD_OPCODES:
+                    # executed before the next frame of the connection is read, to keep the uploads in order
+                    await self._respond(writer, write_lock, in_flight, *frame)
+                    continue
+                task = asyncio.create_task(self._respond(writer, write_lock, in_flight, *frame))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # broken connection or oversized frame: drop the connection
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _respond(self, writer: asyncio.StreamWriter, write_lock: asyncio.Lock, in_flight: asyncio.Semaphore,
+                       opcode: int, request_id: int, payload: bytes):
+        try:
+            loop = asyncio.get_running_loop()
+            try:
+                opcode, payload = await loop.run_in_executor(self._executor, self._execute, opcode, payload)
+            except Exception as e:
+                opcode, payload = OP_ERROR, f"{type(e).__name__}: {e}".encode()
+            if len(payload) > MAX_FRAME:
+                # the peer drops a connection that sends an oversized frame: only this request fails instead
+                opcode, payload = OP_ERROR, f"ValueError: Response of {len(payload)} bytes exceeds the limit of {MAX_FRAME}".encode()
+            async with write_lock:
+                writer.write(FRAME.pack(len(payload), opcode, request_id) + payload)
+                await writer.drain()
+        finally:
+            in_flight.release()
+
+    def _execute(self, opcode: int, payload: bytes) -> Tuple[int, bytes]:
+        """
+        Runs one request on the wrapped server (in a pool thread) and returns the opcode and payload of the response.
+        """
+        if opcode == OP_SEARCH:
+            return OP_RESULTS, _pack_strings(self.server.search(TRAPDOOR.unpack(payload)))
+
+        if opcode in (OP_SEARCH_AND, OP_SEARCH_OR):
+            limit, = COUNT.unpack_from(payload)
+            trapdoors = _unpack_trapdoors(payload, COUNT.size)
+            search = self.server.search_and if opcode == OP_SEARCH_AND else self.server.search_or
+            return OP_RESULTS, _pack_strings(search(trapdoors, None if limit == NO_LIMIT else limit))
+
+        if opcode == OP_FETCH:
+            doc_ids, _ = _unpack_strings(payload)
+            documents = self.server.documents
+            return OP_DOCUMENTS, _pack_documents([(doc_id, documents[doc_id] if doc_id in documents else None)
+                                                  for doc_id in doc_ids])
+
+        if opcode in UPLOAD_OPCODES:
+            if not self.accept_uploads:
+                raise ValueError("This server does not accept index uploads")
+            self._upload(opcode, payload)
+            return OP_OK, b""
+
+        raise ValueError(f"Unknown opcode: {opcode}")
+
+    def _upload(self, opcode: int, payload: bytes):
+        """
+        Applies one upload frame to the wrapped server, which is the sink of the remote client (see core.sink).
+        """
+        if opcode == OP_INDEX_OPEN:
+            capacity, entry_size = INDEX_OPEN.unpack_from(payload)
+            self.server.open_index(bytes(payload[INDEX_OPEN.size:]).decode(), capacity, entry_size)
+        elif opcode == OP_INDEX_GROW:
+            self.server.grow_index(CAPACITY.unpack(payload)[0])
+        elif opcode == OP_INDEX_BEGIN:
+            self.server.begin_batch(_unpack_strings(payload)[0])
+        elif opcode == OP_INDEX_NODES:
+            n, = COUNT.unpack_from(payload)
+            pos = COUNT.size
+            nodes = []
+            for _ in range(n):
+                addr, length = NODE.unpack_from(payload, pos)
+                pos += NODE.size
+                nodes.append((addr, bytes(payload[pos:pos + length])))
+                pos += length
+            self.server.store_nodes(nodes)
+        elif opcode == OP_INDEX_ENTRIES:
+            n, = COUNT.unpack_from(payload)
+            for i in range(n):
+                self.server.store_entry(*ENTRY.unpack_from(payload, COUNT.size + i * ENTRY.size))
+        elif opcode == OP_INDEX_COMMIT:
+            self.server.commit_index()
+        else:
+            self.server.store_documents(_unpack_documents(payload))
+
+
+class _Connection:
+    """
+    One pipelined connection of the client stub: requests are written immediately and a reader task resolves
+    the future of each request when its response arrives, whatever the order.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.request_ids = itertools.count()
+        self.reader_task = asyncio.create_task(self._read_responses())
+
+    async def request(self, opcode: int, payload: bytes) -> Tuple[int, bytes]:
+        if self.reader_task.done():
+            raise ConnectionError("Connection to the server is closed")
+        request_id = next(self.request_ids) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write(FRAME.pack(len(payload), opcode, request_id) + payload)
+        await self.writer.drain()
+        return await future
+
+    async def _read_responses(self):
+        error = ConnectionError("Connection to the server was closed")
+        try:
+            while True:
+                frame = await _read_frame(self.reader)
+                if frame is None:
+                    break
+                opcode, request_id, payload = frame
+                future = self.pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result((opcode, payload))
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            error = e
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        await asyncio.gather(self.reader_task, return_exceptions=True)
+
+
+class RemoteServer:
+    """
+    Async stub of a Server reached through a NetworkServer. It mirrors the search API on trapdoors and fetches
+    ciphertexts; requests are spread round-robin over `connections` persistent connections and any number of them
+    can be awaited concurrently (e.g. with asyncio.gather) without waiting for each other's round trip.
+    """
+
+    def __init__(self, host: str, port: int, connections: int = 1):
+        self.host = host
+        self.port = port
+        self.connections = connections
+        self._connections: List[_Connection] = []
+        self._next = itertools.count()
+
+    async def connect(self) -> "RemoteServer":
+        for _ in range(self.connections):
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            self._connections.append(_Connection(reader, writer))
+        return self
+
+    async def close(self):
+        await asyncio.gather(*(connection.close() for connection in self._connections))
+        self._connections = []
+
+    async def __aenter__(self) -> "RemoteServer":
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _request(self, opcode: int, payload: bytes, expected: int) -> bytes:
+        if not self._connections:
+            raise ConnectionError("RemoteServer is not connected")
+        connection = self._connections[next(self._next) % len(self._connections)]
+        opcode_received, response = await connection.request(opcode, payload)
+        if opcode_received == OP_ERROR:
+            raise RemoteError(response.decode())
+        if opcode_received != expected:
+            raise ValueError(f"Unexpected response opcode: {opcode_received}")
+        return response
+
+    async def search(self, trapdoor: Tuple[int, bytes]) -> List[str]:
+        index, mask = trapdoor
+        response = await self._request(OP_SEARCH, TRAPDOOR.pack(index, bytes(mask)), OP_RESULTS)
+        return _unpack_strings(response)[0]
+
+    async def search_and(self, trapdoors: List[Tuple[int, bytes]], limit: Optional[int] = None) -> List[str]:
+        payload = COUNT.pack(NO_LIMIT if limit is None else limit) + _pack_trapdoors(trapdoors)
+        return _unpack_strings(await self._request(OP_SEARCH_AND, payload, OP_RESULTS))[0]
+
+    async def search_or(self, trapdoors: List[Tuple[int, bytes]], limit: Optional[int] = None) -> List[str]:
+        payload = COUNT.pack(NO_LIMIT if limit is None else limit) + _pack_trapdoors(trapdoors)
+        return _unpack_strings(await self._request(OP_SEARCH_OR, payload, OP_RESULTS))[0]
+
+    async def search_many(self, trapdoors: List[Tuple[int, bytes]]) -> List[List[str]]:
+        """
+        Pipelines one SEARCH per trapdoor and returns the result lists in input order.
+        """
+        return list(await asyncio.gather(*(self.search(trapdoor) for trapdoor in trapdoors)))
+
+    async def fetch_documents(self, doc_ids: List[str]) -> Dict[str, bytes]:
+        """
+        Returns the ciphertexts of the given documents (doc id → ciphertext); unknown ids are left out.
+        """
+        return _unpack_documents(await self._request(OP_FETCH, _pack_strings(doc_ids), OP_DOCUMENTS))
+
+
+class RemoteSink:
+    """
+    Index sink (core.sink) that streams the index to a NetworkServer started with accept_uploads=True, as
+    Client.build_secure_index produces it: Client(sink=RemoteSink(host, port)). The build is synchronous, so the sink
+    uses a plain blocking socket. Nodes, entries and documents are buffered up to UPLOAD_BATCH_BYTES per frame and
+    up to UPLOAD_WINDOW frames are in flight; commit_index (the end of a build) and store_documents return once the
+    server has applied everything sent so far, and a server error is raised there as RemoteError.
+    """
+
+    def __init__(self, host: str, port: int, batch_bytes: int = UPLOAD_BATCH_BYTES):
+        self.socket = socket.create_connection((host, port))
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._responses = self.socket.makefile("rb")
+        self.batch_bytes = batch_bytes
+        self.request_ids = itertools.count()
+        self.unacknowledged = 0
+        self._nodes = []     # packed nodes waiting to be sent
+        self._entries = []   # packed T entries waiting to be sent, after the nodes
+        self._buffered = 0
+
+    def _send(self, opcode: int, payload: bytes):
+        self.socket.sendall(FRAME.pack(len(payload), opcode, next(self.request_ids) & 0xFFFFFFFF) + payload)
+        self.unacknowledged += 1
+        if self.unacknowledged > UPLOAD_WINDOW:
+            self._acknowledge(self.unacknowledged - UPLOAD_WINDOW)
+
+    def _acknowledge(self, frames: int):
+        for _ in range(frames):
+            header = self._responses.read(FRAME.size)
+            if len(header) < FRAME.size:
+                raise ConnectionError("Connection to the server was closed")
+            length, opcode, _ = FRAME.unpack(header)
+            payload = self._responses.read(length)
+            self.unacknowledged -= 1
+            if opcode == OP_ERROR:
+                raise RemoteError(payload.decode())
+            if opcode != OP_OK:
+                raise ValueError(f"Unexpected response opcode: {opcode}")
+
+    def _flush(self):
+        # nodes go first: the entries of the batch point to them
+        if self._nodes:
+            self._send(OP_INDEX_NODES, COUNT.pack(len(self._nodes)) + b"".join(self._nodes))
+        if self._entries:
+            self._send(OP_INDEX_ENTRIES, COUNT.pack(len(self._entries)) + b"".join(self._entries))
+        self._nodes, self._entries, self._buffered = [], [], 0
+
+    def open_index(self, node_format: str, capacity: int, entry_size: int):
+        self._send(OP_INDEX_OPEN, INDEX_OPEN.pack(capacity, entry_size) + node_format.encode())
+
+    def grow_index(self, capacity: int):
+        self._flush()
+        self._send(OP_INDEX_GROW, CAPACITY.pack(capacity))
+
+    def store_nodes(self, nodes: List[Tuple[int, bytes]]):
+        for addr, node in nodes:
+            self._nodes.append(NODE.pack(addr, len(node)) + bytes(node))
+            self._buffered += NODE.size + len(node)
+        if self._buffered >= self.batch_bytes:
+            self._flush()
+
+    def store_entry(self, label: int, entry: bytes):
+        self._entries.append(ENTRY.pack(label, bytes(entry)))
+        self._buffered += ENTRY.size
+
+    def begin_batch(self, doc_ids: List[str]):
+        # frames are applied in order: the doc ids reach the server before the nodes that refer to them
+        self._flush()
+        self._send(OP_INDEX_BEGIN, _pack_strings(doc_ids))
+
+    def commit_index(self):
+        self._flush()
+        self._send(OP_INDEX_COMMIT, b"")
+        self._acknowledge(self.unacknowledged)
+
+    def store_documents(self, encrypted_docs: Mapping[str, bytes]):
+        batch, size = [], 0
+        for doc_id, ciphertext in encrypted_docs.items():
+            batch.append((doc_id, bytes(ciphertext)))
+            size += len(ciphertext)
+            if size >= self.batch_bytes:
+                self._send(OP_STORE, _pack_documents(batch))
+                batch, size = [], 0
+        if batch:
+            self._send(OP_STORE, _pack_documents(batch))
+        self._acknowledge(self.unacknowledged)
+
+    def close(self):
+        try:
+            self._flush()
+            self._acknowledge(self.unacknowledged)
+        finally:
+            self._responses.close()
+            self.socket.close()
+
+    def __enter__(self) -> "RemoteSink":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RemoteClient:
+    """
+    Keyword-level async API for a data owner whose index lives behind a NetworkServer: trapdoors are generated
+    (and cached) by the local Client, sent through a RemoteServer, and fetched documents are decrypted locally.
+    """
+
+    def __init__(self, client: Client, remote: RemoteServer):
+        self.client = client
+        self.remote = remote
+
+    async def search(self, keyword: str) -> List[str]:
+        return await self.remote.search(self.client.generate_trapdoor(keyword))
+
+    async def search_and(self, keywords: List[str], limit: Optional[int] = None) -> List[str]:
+        return await self.remote.search_and(self.client.plan_query(keywords), limit)
+
+    async def search_or(self, keywords: List[str], limit: Optional[int] = None) -> List[str]:
+        return await self.remote.search_or(self.client.plan_query(keywords), limit)
+
+    async def search_many(self, keywords: List[str]) -> List[List[str]]:
+        return await self.remote.search_many(self.client.generate_trapdoors(keywords))
+
+    async def fetch_documents(self, doc_ids: List[str], workers: int = 1, lazy: bool = False) -> Mapping:
+        """
+        Fetches the ciphertexts of the given documents and decrypts them with Client.decrypt_documents.
+        """
+        ciphertexts = await self.remote.fetch_documents(doc_ids)
+        return self.client.decrypt_documents(ciphertexts, workers=workers, lazy=lazy)
@@ -0,0 +1,50 @@
+import json
+import struct
+from typing import Optional, Tuple, Union
+
+NODE_FORMAT_JSON = "json"      # legacy format: {"id", "k", "ptr"} with hex-encoded key and pointer
+NODE_FORMAT_BINARY = "binary"  # fixed-width format described by NODE_STRUCT
+
+NODE_VERSION = 1     # first byte of every binary node, never a valid first byte of a JSON node ('{')
+FLAG_END = 0x01      # set on the last node of a linked list (the pointer field is then meaningless)
+
+# version (1) | flags (1) | doc-id reference (4) | K_{i,j} (16) | next pointer (4) → 26 bytes
+NODE_STRUCT = struct.Struct(">BBI16sI")
+
+# size of an encrypted binary node: 16-byte IV + the 26-byte node padded to 32 bytes
+NODE_CIPHERTEXT_SIZE = 16 + 32
+
+def encode_node(node_format: str, doc_id: str, doc_ref: int, key_next: bytes, next_addr: Optional[int]) -> bytes:
+    """
+    Serializes a node N_{i,j} = ⟨id(D_{i,j}), K_{i,j}, ψ(ctr)⟩ of the linked list of a keyword.
+    A next_addr of None marks the last node of the list.
+    """
+    if node_format == NODE_FORMAT_BINARY:
+        if next_addr is None:
+            return NODE_STRUCT.pack(NODE_VERSION, FLAG_END, doc_ref, key_next, 0)
+        return NODE_STRUCT.pack(NODE_VERSION, 0, doc_ref, key_next, next_addr)
+
+    if node_format == NODE_FORMAT_JSON:
+        node = {
+            "id": doc_id,                                                           # id(D_{i,j})
+            "k": key_next.hex(),                                                    # K_{i,j} in hex format
+            "ptr": "NULL" if next_addr is None else next_addr.to_bytes(4, 'big').hex()  # pointer to the next node
+        }
+        return json.dumps(node).encode()
+
+    raise ValueError(f"Unknown node format: {node_format}")
+
+def decode_node(plaintext: bytes) -> Tuple[Union[int, str], bytes, Optional[int]]:
+    """
+    Parses a decrypted node in either format, returning (doc, key_next, next_addr).
+    doc is the integer doc-id reference for binary nodes and the doc id itself for JSON nodes;
+    next_addr is None at the end of the list.
+    """
+    if plaintext[0] == NODE_VERSION:
+        _, flags, doc_ref, key_next, next_addr = NODE_STRUCT.unpack_from(plaintext)
+        return doc_ref, key_next, None if flags & FLAG_END else next_addr
+
+    node = json.loads(plaintext.decode())
+    if node["ptr"] == "NULL":
+        return node["id"], bytes.fromhex(node["k"]), None
+    return node["id"], bytes.fromhex(node["k"]), int(node["ptr"], 16)
@@ -0,0 +1,42 @@
+import struct
+from typing import Iterable, Iterator, Tuple
+
+# Packed corpus shard (<name>.pack): PACK_MAGIC | PACK_RECORD (doc-id length, content length) | doc id | content | ...
+# Doc ids and contents are utf-8. Large generated corpora are written as packed shards instead of one file per document:
+# utils.generators writes them and core.pipeline reads them, so this module depends on neither.
+PACK_MAGIC = b"SSEDOC\x00\x01"
+PACK_RECORD = struct.Struct(">HI")
+PACK_SUFFIX = ".pack"
+
+
+def write_packed_documents(path: str, documents: Iterable[Tuple[str, str]]):
+    """
+    Writes (doc id, content) pairs to a packed corpus shard.
+    """
+    parts = [PACK_MAGIC]
+    for doc_id, content in documents:
+        encoded_id, encoded = doc_id.encode(), content.encode()
+        parts.append(PACK_RECORD.pack(len(encoded_id), len(encoded)))
+        parts.append(encoded_id)
+        parts.append(encoded)
+    with open(path, "wb") as f:
+        f.write(b"".join(parts))
+
+
+def read_packed_documents(path: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yields the (doc id, content) pairs of a packed corpus shard in the order they were written.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(PACK_MAGIC):
+        raise ValueError(f"{path} is not a packed corpus shard")
+
+    pos = len(PACK_MAGIC)
+    while pos < len(data):
+        id_length, length = PACK_RECORD.unpack_from(data, pos)
+        pos += PACK_RECORD.size
+        doc_id = data[pos:pos + id_length].decode()
+        pos += id_length
+        yield doc_id, data[pos:pos + length].decode()
+        pos += length
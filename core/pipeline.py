@@ -0,0 +1,189 @@
+import os
+import time
+import queue
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from core.client import Client, ENCRYPTED_FOLDER
+from core.packed import PACK_SUFFIX, read_packed_documents
+from core.server import Server
+
+PIPELINE_QUEUE_SIZE = 256    # documents buffered between two stages
+PIPELINE_BATCH_SIZE = 1_000  # documents handed to the index builder at once
+
+_DONE = object()  # end-of-stream marker passed down the stages
+
+
+class _Failure:
+    """
+    Carries an exception raised inside a stage down to the consumer, which re-raises it.
+    """
+
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+def scan_documents(folder: str) -> Iterator[Tuple[str, str]]:
+    """
+    Scans the corpus folder lazily and yields (doc id, content) for every .txt document, one file at a time.
+    Subfolders (sharded corpora) are scanned recursively and packed shards are read one shard at a time.
+    """
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                yield from scan_documents(entry.path)
+            elif entry.name.endswith(".txt") and entry.is_file():
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    yield entry.name, f.read()
+            elif entry.name.endswith(PACK_SUFFIX) and entry.is_file():
+                yield from read_packed_documents(entry.path)
+
+
+def _produce(source: Iterator, output: queue.Queue, stop: threading.Event):
+    try:
+        for item in source:
+            if stop.is_set():
+                break
+            output.put(item)
+        output.put(_DONE)
+    except BaseException as e:
+        output.put(_Failure(e))
+    finally:
+        if hasattr(source, "close"):
+            source.close()  # a generator source (e.g. extract_all) releases its process pool here
+
+
+def _transform(fn: Callable, inq: queue.Queue, output: queue.Queue, stop: threading.Event):
+    try:
+        while True:
+            item = inq.get()
+            if stop.is_set():
+                output.put(_DONE)
+                return
+            if item is _DONE or isinstance(item, _Failure):
+                output.put(item)
+                return
+            output.put(fn(item))
+    except BaseException as e:
+        output.put(_Failure(e))
+
+
+def _start(target: Callable, *args) -> threading.Thread:
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def _stop(stop: threading.Event, threads: List[threading.Thread], queues: List[queue.Queue]):
+    """
+    Stops the stages: they see `stop` after their current item, and draining the queues unblocks the ones waiting
+    to put into a full queue, until every thread has finished.
+    """
+    stop.set()
+    while any(thread.is_alive() for thread in threads):
+        for q in queues:
+            try:
+                while True:
+                    q.get_nowait()
+            except queue.Empty:
+                pass
+        for thread in threads:
+            thread.join(0.01)
+
+
+def ingest(client: Client, server: Server, folder: str = "data/documents", batch_size: int = PIPELINE_BATCH_SIZE,
+           queue_size: int = PIPELINE_QUEUE_SIZE, encrypted_folder: Optional[str] = ENCRYPTED_FOLDER,
+           workers: int = 1, extract_workers: int = 1) -> Dict[str, float]:
+    """
+    Streams a corpus from disk into the encrypted index in bounded memory.
+
+    Each stage runs in its own thread and stages are connected by queues of `queue_size` documents:
+    scan + read → extract keywords → encrypt → append to the document segment (skipped when encrypted_folder is None)
+    → index builder.
+    Disk I/O and AES release the GIL, so reading, encryption and writing overlap with index construction. Every
+    `batch_size` documents the builder extends the index (Client.build_secure_index incremental mode) and uploads the
+    batch to the server, so peak memory is bounded by the queues and one batch, not by the corpus size.
+    When `server` is the client's sink (a Server, SnapshotSink or RemoteSink, see core.sink), the index reaches it as
+    it is built and the client holds no copy of it.
+    With extract_workers > 1, reading and keyword extraction are merged into one stage that extracts in a process pool
+    (KeywordExtractor.extract_all), for extractors with many fields.
+    If the builder or the server raises, the stages are stopped (and the extraction pool shut down) before the
+    exception propagates.
+
+    Returns the number of documents and (w, id) pairs ingested, the time spent building the index and the total time.
+    """
+    start = time.perf_counter()
+    if encrypted_folder is not None:
+        os.makedirs(encrypted_folder, exist_ok=True)
+
+    read_q = queue.Queue(queue_size)
+    keyword_q = queue.Queue(queue_size)
+    encrypted_q = queue.Queue(queue_size)
+    written_q = queue.Queue(queue_size)
+    stop = threading.Event()  # set when the consumer stops early, e.g. because the index builder raised
+
+    def extract(item):
+        doc_id, content = item
+        return doc_id, content, client.extract_keywords(content)
+
+    def encrypt(item):
+        doc_id, content, keywords = item
+        return doc_id, keywords, client.encrypt_document(content)
+
+    def write(item):
+        doc_id, _, encrypted = item
+        client.write_encrypted_document(doc_id, encrypted, encrypted_folder)
+        return item
+
+    if extract_workers > 1:
+        threads = [_start(_produce, client.extractor.extract_all(scan_documents(folder), workers=extract_workers),
+                          keyword_q, stop)]
+    else:
+        threads = [_start(_produce, scan_documents(folder), read_q, stop),
+                   _start(_transform, extract, read_q, keyword_q, stop)]
+    threads.append(_start(_transform, encrypt, keyword_q, encrypted_q, stop))
+    if encrypted_folder is not None:
+        threads.append(_start(_transform, write, encrypted_q, written_q, stop))
+    else:
+        written_q = encrypted_q
+
+    stats = {"documents": 0, "pairs": 0, "index_time": 0.0}
+    batch_keywords = {}
+    batch_documents = {}
+
+    def flush():
+        index_start = time.perf_counter()
+        client.build_secure_index(batch_keywords, workers=workers)
+        stats["index_time"] += time.perf_counter() - index_start
+        server.store_documents(batch_documents)
+        if client.sink is not server:
+            server.store_index(client.A, client.T, client.doc_ids)  # index kept by the client (MemorySink)
+        batch_keywords.clear()
+        batch_documents.clear()
+
+    try:
+        while True:
+            item = written_q.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.exception
+
+            doc_id, keywords, encrypted = item
+            batch_documents[doc_id] = encrypted
+            if keywords:
+                batch_keywords[doc_id] = keywords
+                stats["pairs"] += len(keywords)
+            stats["documents"] += 1
+            if len(batch_documents) >= batch_size:
+                flush()
+    finally:
+        # after an error the stages may still be running or blocked on a full queue: stop them before re-raising
+        _stop(stop, threads, [read_q, keyword_q, encrypted_q, written_q])
+
+    if batch_documents:
+        flush()
+    client.flush_encrypted_documents()  # the write stage has finished: write its last buffered documents
+
+    stats["total_time"] = time.perf_counter() - start
+    return stats
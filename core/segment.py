@@ -0,0 +1,144 @@
+import os
+import mmap
+import struct
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, Mapping, Optional, Tuple
+
+# A segment is a pair of append-only files:
+#   <path>.seg  MAGIC | ciphertext | ciphertext | ...
+#   <path>.idx  one INDEX_RECORD (offset, length, doc-id length) + utf-8 doc id per stored or deleted document
+# Ciphertexts are written before their index records, so a crash can only leave unreferenced bytes at the end of the
+# data file or a truncated last index record, both discarded when the segment is reopened. A document stored again is
+# appended and its newest record wins; a deletion appends a record with the length DELETED.
+MAGIC = b"SSESEG\x00\x01"
+INDEX_RECORD = struct.Struct(">QIH")
+DELETED = 0xFFFFFFFF
+
+SEGMENT_BUFFER_SIZE = 4 * 1024 * 1024  # bytes of pending ciphertexts written to disk with a single write
+
+
+class SegmentStore(MutableMapping):
+    """
+    Mapping doc id → encrypted document stored in a packed segment instead of one file per document.
+    Writes are appended to an in-memory buffer and reach the files in bulk (every SEGMENT_BUFFER_SIZE bytes or on
+    flush); reads return memoryview slices of a read-only mapping of the data file, so fetching a document costs a
+    dict lookup and a page fault rather than an open/read/close.
+    Only the offset index (doc id → (offset, length)) is kept in memory.
+    """
+
+    def __init__(self, path: str, buffer_size: int = SEGMENT_BUFFER_SIZE):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.index: Dict[str, Tuple[int, int]] = {}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._data = open(path + ".seg", "a+b")
+        self._data.seek(0, os.SEEK_END)
+        if self._data.tell() == 0:
+            self._data.write(MAGIC)
+            self._data.flush()
+        self._end = self._data.tell()  # size of the data file once the pending buffer is written
+        self._load_index()
+        self._records = open(path + ".idx", "ab")
+
+        self._pending = []        # ciphertexts appended since the last flush
+        self._pending_index = []  # their index records
+        self._pending_size = 0
+        self._view = None  # read-only mapping of the data file
+
+    def _load_index(self):
+        self._data.seek(0)
+        if self._data.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{self.path}.seg is not a document segment")
+        if not os.path.exists(self.path + ".idx"):
+            return
+
+        with open(self.path + ".idx", "rb") as f:
+            records = f.read()
+        pos = 0
+        while pos + INDEX_RECORD.size <= len(records):
+            offset, length, id_length = INDEX_RECORD.unpack_from(records, pos)
+            end = pos + INDEX_RECORD.size + id_length
+            if end > len(records):
+                break  # truncated last record
+            doc_id = records[pos + INDEX_RECORD.size:end].decode()
+            if length == DELETED:
+                self.index.pop(doc_id, None)
+            elif offset + length <= self._end:
+                self.index[doc_id] = (offset, length)
+            pos = end
+        if pos < len(records):
+            # drop the truncated record, or records appended after it would be misread
+            with open(self.path + ".idx", "r+b") as f:
+                f.truncate(pos)
+
+    def _append(self, doc_id: str, ciphertext: bytes):
+        encoded_id = doc_id.encode()
+        self.index[doc_id] = (self._end, len(ciphertext))
+        self._pending.append(ciphertext)
+        self._pending_index.append(INDEX_RECORD.pack(self._end, len(ciphertext), len(encoded_id)) + encoded_id)
+        self._end += len(ciphertext)
+        self._pending_size += len(ciphertext)
+
+    def flush(self):
+        """
+        Writes the pending ciphertexts with one write call, then their index records.
+        """
+        if not self._pending_index:
+            return
+        self._data.write(b"".join(self._pending))
+        self._data.flush()
+        self._records.write(b"".join(self._pending_index))
+        self._records.flush()
+        self._pending.clear()
+        self._pending_index.clear()
+        self._pending_size = 0
+
+    def _mapped(self, end: int) -> memoryview:
+        # the data file only grows: remap it when a read reaches past the current mapping. The previous mapping is
+        # not closed, documents returned earlier may still be views of it; it is unmapped once they are released
+        if self._view is None or end > len(self._view):
+            self.flush()
+            self._view = memoryview(mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ))
+        return self._view
+
+    def __getitem__(self, doc_id: str) -> memoryview:
+        offset, length = self.index[doc_id]
+        return self._mapped(offset + length)[offset:offset + length]
+
+    def get(self, doc_id: str, default=None) -> Optional[memoryview]:
+        if doc_id not in self.index:
+            return default
+        return self[doc_id]
+
+    def __setitem__(self, doc_id: str, ciphertext: bytes):
+        self._append(doc_id, ciphertext)
+        if self._pending_size >= self.buffer_size:
+            self.flush()
+
+    def update(self, documents: Mapping[str, bytes]):
+        """
+        Appends a batch of documents, writing them to disk in buffer-sized chunks.
+        """
+        for doc_id, ciphertext in documents.items():
+            self[doc_id] = ciphertext
+
+    def __delitem__(self, doc_id: str):
+        del self.index[doc_id]
+        encoded_id = doc_id.encode()
+        self._pending_index.append(INDEX_RECORD.pack(0, DELETED, len(encoded_id)) + encoded_id)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def close(self):
+        self.flush()
+        self._view = None
+        self._data.close()
+        self._records.close()
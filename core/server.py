@@ -1,38 +1,168 @@
-import json
-from typing import Dict, List, Tuple
-from core.crypto import SKE_decrypt
+import heapq
+import queue
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from core.cache import LRUCache
+from core.crypto import SKE_decrypt, SKE_encrypt
+from core.metrics import metrics
+from core.node import NODE_CIPHERTEXT_SIZE, NODE_FORMAT_BINARY, NODE_FORMAT_JSON, decode_node, encode_node
+from core.store import CuckooTable, SlotStore
+from core.segment import SegmentStore
+from core.snapshot import save_snapshot, open_snapshot
+
+SEARCH_WORKERS = 4       # default pool size of search_many
+SEARCH_BATCH_SIZE = 64   # default number of trapdoors handled by one pool task
+COMPACTION_THRESHOLD = 0.25  # default fraction of tombstoned nodes above which a list is compacted
+RESULT_CACHE_ENTRIES = 10_000  # default entry bound of the result cache when only a byte bound is given
+RESULT_ENTRY_OVERHEAD = 8      # bytes counted per cached doc id on top of its length (the list slot)
+
+logger = logging.getLogger(__name__)
+
+_pool_server = None  # per-process copy of the server used by the workers of a process-based search_many
+
+
+def _init_pool_server(A, T, doc_ids, tombstones):
+    global _pool_server
+    _pool_server = Server()
+    _pool_server.store_index(A, T, doc_ids)
+    _pool_server.tombstones = tombstones
+
+
+def _result_size(result: Tuple[str, ...]) -> int:
+    return sum(len(doc_id) + RESULT_ENTRY_OVERHEAD for doc_id in result)
+
+
+def _search_batch_in_pool(batch: List[Tuple[int, bytes]]) -> List[List[str]]:
+    return [_pool_server.search(trapdoor) for trapdoor in batch]
 
 
 class Server:
-    def __init__(self):
+    def __init__(self, compaction_threshold: float = COMPACTION_THRESHOLD, documents_path: Optional[str] = None,
+                 result_cache_entries: Optional[int] = None, result_cache_bytes: Optional[int] = None):
         self.A = {}           # encrypted nodes (linked list)
         self.T = {}           # lookup table
-        self.documents = {}   # encrypted documents
+        # encrypted documents, packed in a segment file read through mmap when documents_path is given
+        self.documents = SegmentStore(documents_path) if documents_path is not None else {}
+        self.doc_ids = []     # doc-id table used to resolve the references stored in binary nodes
+        self._doc_refs = None # reverse doc-id table, built on demand for legacy JSON nodes
+
+        self.tombstones = set()  # references of deleted documents, skipped by searches
+        self.compaction_threshold = compaction_threshold  # fraction of deleted nodes that queues a list for compaction
+        self._compaction_queue = queue.Queue()  # heads ⟨addr, K⟩ of the lists waiting for compaction
+        self._compaction_pending = set()
+        self._compactor = None  # background compaction thread
+        self._retired = []      # (epoch, slots) removed by compactions and not released yet
+        self._epoch = 0         # compaction epoch, bumped by every compaction
+        self._readers = {}      # epoch → traversals started in that epoch and not finished yet
+        self._readers_lock = threading.Lock()
+        self._lock = threading.Lock()  # serializes updates of the index (readers do not take it)
+
+        # trapdoor → result list of search, for repeated queries (disabled unless a bound is given)
+        self.result_cache = None
+        if result_cache_entries is not None or result_cache_bytes is not None:
+            self.result_cache = LRUCache(result_cache_entries or RESULT_CACHE_ENTRIES, result_cache_bytes, _result_size)
+        self._cache_lock = threading.Lock()
+        self._cache_generation = 0  # bumped by every invalidation, so a search racing with an update is not cached
+
+        # executor kind → (pool, workers, index generation) of search_many, kept until close(). Process workers hold a
+        # copy of the index taken when they start, so their pool is replaced once the index generation has changed
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+        self._index_generation = 0  # bumped by every change of the index or of the tombstones
 
-    def store_index(self, A: Dict[int, bytes], T: Dict[int, bytes]):
+    def store_index(self, A: Union[SlotStore, Dict[int, bytes]], T: Union[CuckooTable, Dict[int, bytes]], doc_ids: Optional[List[str]] = None):
         """
-        Stores the encrypted index structures A and T.
+        Stores the encrypted index structures A and T, together with the client's doc-id table when binary nodes are used.
+        Both structures are only accessed through get/contains/getitem, so slot stores and plain dicts are interchangeable.
+        A T given as a dict (label → entry) is copied into a CuckooTable, the only layout snapshots can store.
         """
+        if isinstance(T, dict) and T:
+            table = CuckooTable(len(next(iter(T.values()))))
+            for label, entry in T.items():
+                table[label] = entry
+            T = table
         self.A = A
         self.T = T
+        if doc_ids is not None:
+            self.doc_ids = doc_ids
+        self.invalidate_cache()
+
+    def open_index(self, node_format: str, capacity: int, entry_size: int):
+        """
+        Makes the server the sink of a client (core.sink): the current index is replaced by an empty one, which
+        Client.build_secure_index then fills list by list, so the client never holds the index itself.
+        """
+        with self._lock:
+            self.A = SlotStore(capacity, NODE_CIPHERTEXT_SIZE) if node_format == NODE_FORMAT_BINARY else {}
+            self.T = CuckooTable(entry_size)
+            self.doc_ids = []
+            self._doc_refs = None
+            self.tombstones = set()
+        self.invalidate_cache()
+
+    def grow_index(self, capacity: int):
+        with self._lock:
+            if isinstance(self.A, SlotStore):
+                self.A.grow(capacity)
+
+    def begin_batch(self, doc_ids: List[str]):
+        # the doc ids are known before any node refers to them, so a concurrent search can always resolve a reference
+        with self._lock:
+            self.doc_ids.extend(doc_ids)
+
+    def store_nodes(self, nodes: List[Tuple[int, bytes]]):
+        with self._lock:
+            for addr, node in nodes:
+                self.A[addr] = node
+
+    def store_entry(self, label: int, entry: bytes):
+        # the nodes of the list are already stored: a search that reads the new entry finds a complete list
+        with self._lock:
+            self.T[label] = entry
+
+    def commit_index(self):
+        self.invalidate_cache()
 
     def store_documents(self, encrypted_docs: Dict[str, bytes]):
         """
-        Stores encrypted documents sent by the client.
+        Stores encrypted documents sent by the client. Each call adds to the documents already stored,
+        so the corpus can be uploaded in batches.
         """
-        self.documents = encrypted_docs
+        self.documents.update(encrypted_docs)
+        if isinstance(self.documents, SegmentStore):
+            self.documents.flush()
 
-    def search(self, trapdoor: Tuple[int, bytes]) -> List[str]:
+    def save_snapshot(self, path: str):
         """
-        Uses the trapdoor t to search the encrypted index and returns the list of matching document IDs.
+        Persists the encrypted index and documents to a snapshot file that a later server can reopen with `from_snapshot`.
         """
-        index_pos, mask = trapdoor  # γ, η = (π_{K3}(w), f_{K2}(w))
+        save_snapshot(path, self.A, self.T, self.doc_ids, self.documents, self.tombstones)
 
-        # if there's no entry at the computed index, return empty
-        if index_pos not in self.T:
-            return []
+    @classmethod
+    def from_snapshot(cls, path: str, **options) -> "Server":
+        """
+        Starts a server over a snapshot file. The file is memory-mapped, so startup cost does not depend on the
+        index size: only the pages of A, T and the documents that searches actually touch are read from disk.
+        `options` are passed to the constructor (e.g. the result cache bounds).
+        """
+        server = cls(**options)
+        server.A, server.T, server.doc_ids, server.documents, server.tombstones = open_snapshot(path)
+        return server
+
+    def _open_list(self, trapdoor: Tuple[int, bytes]) -> Optional[Tuple[int, bytes]]:
+        """
+        Unmasks the T entry selected by a trapdoor and returns the address and key of the first node of its list,
+        or None when the keyword has no entry.
+        """
+        index_pos, mask = trapdoor  # γ, η = (π_{K3}(w), f_{K2}(w))
 
-        t_entry = self.T[index_pos]
+        # if there's no entry for the label, return empty (T is a cuckoo table: at most two probes)
+        t_entry = self.T.get(index_pos)
+        if t_entry is None:
+            return None
 
         # ensure sizes match before applying XOR
         if len(mask) != len(t_entry):
@@ -48,33 +178,457 @@ class Server:
         key = entry_plain[4:20] # K: decryption key for first node
 
         assert len(key) == 16, f"Recovered key length is {len(key)}, should be 16 bytes for AES"
+        return addr, key
+
+    def _walk(self, addr: int, key: bytes) -> Iterator[Tuple[int, bytes, Union[int, str], Optional[int], bytes]]:
+        """
+        Traverses the encrypted linked list starting from addr, yielding every node as soon as it is decrypted:
+        (address, key that decrypted it, document, address of the next node or None at the end, key of the next node).
+        The document is the doc-id reference for binary nodes and the doc id itself for legacy JSON nodes.
+        """
+        totals = {}  # AES and node decoding time of this traversal, when metrics are enabled
+        if metrics.enabled:
+            decrypt = metrics.accumulate(totals, "aes", SKE_decrypt)
+            decode = metrics.accumulate(totals, "decode", decode_node)
+        else:
+            decrypt, decode = SKE_decrypt, decode_node
+
+        # register the traversal: the slots a compaction removes stay readable until the traversals that were already
+        # running when it happened (and may still be inside the old list) have finished
+        with self._readers_lock:
+            epoch = self._epoch
+            self._readers[epoch] = self._readers.get(epoch, 0) + 1
+
+        first = True
+        try:
+            while True:
+                encrypted_node = self.A.get(addr)
+                if not encrypted_node:
+                    if not first:
+                        # only a traversal resumed from a stale cursor can get here (see search_page)
+                        raise ValueError(f"Node {addr} was removed by a compaction: the cursor is no longer valid")
+                    break  # no node found at this address — stop
+                first = False
+                try:
+                    # decrypt the current node using the key from the previous step
+                    plaintext = decrypt(key, encrypted_node)
+                    doc, next_key, next_addr = decode(plaintext)
+                except Exception:
+                    metrics.count("search.decrypt_failures")
+                    logger.error("Failed to decrypt the node at address %d", addr)
+                    raise
+
+                yield addr, key, doc, next_addr, next_key
+
+                # if the current node is the last one in the list, stop
+                if next_addr is None:
+                    break
+
+                # otherwise, prepare for the next node and update addr to point to the next node in the list
+                addr = next_addr
+
+                # get the key to decrypt the next node
+                key = next_key
+                assert len(key) == 16, f"Next key is {len(key)} bytes — expected 16"
+        finally:
+            with self._readers_lock:
+                self._readers[epoch] -= 1
+                if not self._readers[epoch]:
+                    del self._readers[epoch]
+            metrics.record("search", totals)
+
+    def _iter_nodes(self, addr: int, key: bytes) -> Iterator[Tuple[Union[int, str], Optional[int], bytes]]:
+        """
+        Traverses a list yielding (document, next address, next key) for every node whose document was not deleted.
+        When a complete traversal finds that deleted documents exceed the compaction threshold, the list is queued
+        for compaction.
+        """
+        head = addr, key
+        total = dead = 0
+        try:
+            for _, _, doc, next_addr, next_key in self._walk(addr, key):
+                total += 1
+                if self.tombstones and self._ref_of(doc) in self.tombstones:
+                    dead += 1  # tombstoned (w, id) pair: skipped, but the traversal goes on
+                    continue
+                yield doc, next_addr, next_key
+        finally:
+            metrics.observe("search.nodes", total)  # nodes decrypted by this traversal, complete or not
+            metrics.count("search.tombstoned", dead)
+
+        if dead and dead >= total * self.compaction_threshold and head not in self._compaction_pending:
+            self._compaction_pending.add(head)
+            self._compaction_queue.put(head)
+
+    def _iter_list(self, addr: int, key: bytes) -> Iterator[Union[int, str]]:
+        for doc, _, _ in self._iter_nodes(addr, key):
+            yield doc
+
+    def _doc_id(self, doc: Union[int, str]) -> str:
+        return self.doc_ids[doc] if isinstance(doc, int) else doc
+
+    def _ref_of(self, doc: Union[int, str]) -> int:
+        """
+        Returns the doc-id reference of a node document. Legacy JSON nodes store the doc id itself,
+        which is mapped back through a reverse doc-id table built on demand.
+        """
+        if isinstance(doc, int):
+            return doc
+        if self._doc_refs is None or len(self._doc_refs) != len(self.doc_ids):
+            self._doc_refs = {doc_id: ref for ref, doc_id in enumerate(self.doc_ids)}
+        return self._doc_refs[doc]
+
+    def _iter_refs(self, addr: int, key: bytes) -> Iterator[int]:
+        """
+        Traverses a list yielding doc-id references, which the client writes in descending order in every list.
+        """
+        for doc in self._iter_list(addr, key):
+            yield self._ref_of(doc)
+
+    def delete_documents(self, doc_ids: List[str]):
+        """
+        Deletes documents: their ciphertexts are dropped and their references are tombstoned, so every (w, id) pair of
+        these documents is skipped by searches at the cost of a set lookup per node, without touching A or T.
+        Lists where tombstones pile up are rewritten by the compactor (see compact), which shortens their traversal but
+        does not shrink the index: the tombstone set only grows, as do A and T.
+        """
+        with self._lock:
+            for doc_id in doc_ids:
+                if doc_id in self.documents:
+                    del self.documents[doc_id]
+                try:
+                    self.tombstones.add(self._ref_of(doc_id))
+                except KeyError:
+                    pass  # document without keywords: it is not referenced by any list
+            if isinstance(self.documents, SegmentStore):
+                self.documents.flush()
+            self.invalidate_cache()
+
+    def invalidate_cache(self):
+        """
+        Drops every cached search result. Called whenever the index or the set of live documents changes, which also
+        retires the process workers of search_many.
+        """
+        self._index_generation += 1
+        if self.result_cache is not None:
+            with self._cache_lock:
+                self._cache_generation += 1
+                self.result_cache.clear()
+
+    def cache_stats(self) -> Dict[str, Optional[int]]:
+        """
+        Returns the hits, misses, entries and size in bytes of the result cache (all zero when it is disabled). The size
+        is only tracked under a byte bound: without one, "bytes" is None rather than a misleading 0.
+        """
+        if self.result_cache is None:
+            return {"hits": 0, "misses": 0, "entries": 0, "bytes": 0}
+        with self._cache_lock:
+            size = self.result_cache.size if self.result_cache.max_size is not None else None
+            return {"hits": self.result_cache.hits, "misses": self.result_cache.misses,
+                    "entries": len(self.result_cache), "bytes": size}
+
+    def compact(self, head: Tuple[int, bytes]) -> int:
+        """
+        Rewrites the list starting at head = ⟨addr, K⟩ without its tombstoned nodes and returns how many nodes were
+        removed. The server learns every node key while traversing a list it holds a trapdoor for, so it can re-encrypt
+        each surviving node under its original key with a pointer to the next surviving node: nothing is revealed beyond
+        what searching the list already revealed. The head is always kept (and stays tombstoned if it was deleted),
+        so T and the client's ⟨addr, K⟩ of the head, where new batches are linked in, remain valid.
+
+        Removed slots are not released here: a later compaction releases them once every traversal that started before
+        this one has finished, so searches already inside the list (including paused search_iter generators) still read
+        the old nodes.
+
+        Compaction makes searches faster, it does not reclaim space. A released slot is only marked empty in the
+        occupancy bitmap of A: the client allocates addresses from its counter and permutation (Client._grow) and never
+        hands a released address out again. The buffer of A (capacity × cell size) and T only grow, epoch by epoch, so
+        under sustained add/delete churn the index is not bounded; rebuilding it from the live documents shrinks it.
+        """
+        with self._lock:
+            self._release_retired()
+
+            nodes = list(self._walk(*head))
+            live = [node for i, node in enumerate(nodes) if i == 0 or self._ref_of(node[2]) not in self.tombstones]
+
+            for i, (addr, key, doc, next_addr, next_key) in enumerate(live):
+                successor = live[i + 1] if i + 1 < len(live) else None
+                new_next = successor[0] if successor else None
+                if new_next == next_addr:
+                    continue  # the successor of this node did not change
+                new_key = successor[1] if successor else b'0' * 16  # dummy key (0^k) at the end of the list
+
+                node_format = NODE_FORMAT_BINARY if isinstance(doc, int) else NODE_FORMAT_JSON
+                node = encode_node(node_format, self._doc_id(doc), self._ref_of(doc), new_key, new_next)
+                self.A[addr] = SKE_encrypt(key, node)
+
+            live_addrs = {node[0] for node in live}
+            retired = [node[0] for node in nodes if node[0] not in live_addrs]
+            with self._readers_lock:
+                self._retired.append((self._epoch, retired))
+                self._epoch += 1  # traversals starting from now on only see the rewritten list
+            self._index_generation += 1  # results are unchanged, but process workers still hold the old nodes
+            self._compaction_pending.discard(head)
+            return len(retired)
+
+    def _release_retired(self):
+        """
+        Deletes the slots retired in epochs that no running traversal started in or before (called under _lock).
+        """
+        with self._readers_lock:
+            oldest = min(self._readers, default=self._epoch)
+            released = [slots for epoch, slots in self._retired if epoch < oldest]
+            self._retired = [(epoch, slots) for epoch, slots in self._retired if epoch >= oldest]
+        for slots in released:
+            for addr in slots:
+                if addr in self.A:
+                    del self.A[addr]
+
+    def start_compactor(self):
+        """
+        Starts a background thread that compacts the lists queued by searches (see _iter_nodes).
+        """
+        if self._compactor is None:
+            self._compactor = threading.Thread(target=self._run_compactor, daemon=True)
+            self._compactor.start()
+
+    def stop_compactor(self):
+        if self._compactor is not None:
+            self._compaction_queue.put(None)
+            self._compactor.join()
+            self._compactor = None
+
+    def _run_compactor(self):
+        while True:
+            head = self._compaction_queue.get()
+            if head is None:
+                break
+            self.compact(head)
+
+    def search(self, trapdoor: Tuple[int, bytes]) -> List[str]:
+        """
+        Uses the trapdoor t to search the encrypted index and returns the list of matching document IDs.
+        With the result cache enabled, a repeated trapdoor is answered from the cache without traversing its list.
+        """
+        with metrics.phase("search"):
+            if self.result_cache is None:
+                return self._search(trapdoor)
+
+            # the whole trapdoor is the key: a label with a different mask must not reuse the result of the label
+            key = (trapdoor[0], bytes(trapdoor[1]))
+            with self._cache_lock:
+                cached = self.result_cache.get(key)
+                generation = self._cache_generation
+            if cached is not None:
+                metrics.count("search.cache_hits")
+                return list(cached)
+
+            metrics.count("search.cache_misses")
+            result = self._search(trapdoor)
+            with self._cache_lock:
+                if generation == self._cache_generation:
+                    self.result_cache.put(key, tuple(result))
+            return result
+
+    def _search(self, trapdoor: Tuple[int, bytes]) -> List[str]:
+        head = self._open_list(trapdoor)
+        if head is None:
+            metrics.count("search.misses")
+            return []
+
+        # collect the document ID of every node (binary nodes carry a reference into the doc-id table)
+        return [self._doc_id(doc) for doc in self._iter_list(*head)]
+
+    def _resume(self, cursor: Tuple[int, bytes]) -> Tuple[int, bytes]:
+        if cursor[0] not in self.A:
+            raise ValueError(f"Node {cursor[0]} was removed by a compaction: the cursor is no longer valid")
+        return cursor
+
+    def search_iter(self, trapdoor: Tuple[int, bytes], limit: Optional[int] = None,
+                    cursor: Optional[Tuple[int, bytes]] = None) -> Iterator[str]:
+        """
+        Generator version of search: yields matching document IDs as nodes are decrypted, so the time to the first
+        result does not depend on the length of the list. Stops after `limit` documents; `cursor` (from search_page)
+        resumes a previous traversal instead of starting at the head of the list.
+        """
+        head = self._resume(cursor) if cursor is not None else self._open_list(trapdoor)
+        if head is None or (limit is not None and limit <= 0):
+            return
+
+        count = 0
+        for doc in self._iter_list(*head):
+            yield self._doc_id(doc)
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+    def search_page(self, trapdoor: Tuple[int, bytes], limit: int,
+                    cursor: Optional[Tuple[int, bytes]] = None) -> Tuple[List[str], Optional[Tuple[int, bytes]]]:
+        """
+        Returns one page of at most `limit` results and the cursor of the next page (None once the list is exhausted).
+        The cursor is the ⟨addr, K⟩ pair of the next unread node: passing it back continues the traversal where this page
+        stopped, without decrypting the previous pages again.
+
+        A cursor does not keep its list alive between calls: if the list was compacted in the meantime and the nodes
+        the cursor leads to were released, resuming raises ValueError instead of returning a truncated page.
+        """
+        head = self._resume(cursor) if cursor is not None else self._open_list(trapdoor)
+        if head is None:
+            return [], None
+
+        results = []
+        next_cursor = head
+        if limit <= 0:
+            return results, next_cursor
+
+        for doc, next_addr, next_key in self._iter_nodes(*head):
+            results.append(self._doc_id(doc))
+            next_cursor = None if next_addr is None else (next_addr, next_key)
+            if len(results) >= limit:
+                break
+        else:
+            next_cursor = None  # the list ended (or was cut short) before filling the page
+        return results, next_cursor
+
+    def search_and(self, trapdoors: List[Tuple[int, bytes]], limit: Optional[int] = None) -> List[str]:
+        """
+        Conjunctive query: documents matching every trapdoor.
+
+        Lists are sorted by descending doc reference, so they are intersected as streams (leapfrog join): every list
+        only advances until it reaches the current candidate, the join stops as soon as any list is exhausted, and it
+        stops after `limit` matches. Trapdoors should come shortest list first (see Client.plan_query), so that missing
+        keywords and short lists settle the result before the long lists are read further than needed.
+        """
+        streams = []
+        for trapdoor in trapdoors:
+            head = self._open_list(trapdoor)
+            if head is None:
+                return []  # a keyword without entries empties the intersection: no list is traversed
+            streams.append(self._iter_refs(*head))
 
         results = []
+        if limit is not None and limit <= 0:
+            return results
+
+        current = []
+        for stream in streams:
+            ref = next(stream, None)
+            if ref is None:
+                return results
+            current.append(ref)
 
-        # traverse the encrypted linked list starting from addr
         while True:
-            encrypted_node = self.A.get(addr)
-            if not encrypted_node:
-                break  # no node found at this address — stop
-            try:
-                # decrypt the current node using the key from the previous step
-                plaintext = SKE_decrypt(key, encrypted_node)
-                decrypted = json.loads(plaintext.decode())
-            except Exception as e:
-                print("Failed to decrypt node")
-                raise e
-
-            # collect the document ID from the current node
-            results.append(decrypted["id"])
-
-            # if the current node is the last one in the list, stop
-            if decrypted["ptr"] == "NULL":
+            target = min(current)
+            for i, stream in enumerate(streams):
+                while current[i] > target:
+                    current[i] = next(stream, None)
+                    if current[i] is None:
+                        return results
+
+            if all(ref == target for ref in current):
+                results.append(self.doc_ids[target])
+                if limit is not None and len(results) >= limit:
+                    return results
+                for i, stream in enumerate(streams):
+                    current[i] = next(stream, None)
+                    if current[i] is None:
+                        return results
+
+    def search_or(self, trapdoors: List[Tuple[int, bytes]], limit: Optional[int] = None) -> List[str]:
+        """
+        Disjunctive query: documents matching any trapdoor, in descending reference order and without duplicates.
+        The lists are merged as streams, so with a limit only the prefix of each list needed for the first `limit`
+        documents is decrypted.
+        """
+        streams = []
+        for trapdoor in trapdoors:
+            head = self._open_list(trapdoor)
+            if head is not None:
+                streams.append(self._iter_refs(*head))
+
+        results = []
+        if limit is not None and limit <= 0:
+            return results
+
+        previous = None
+        for ref in heapq.merge(*streams, reverse=True):
+            if ref == previous:
+                continue
+            results.append(self.doc_ids[ref])
+            previous = ref
+            if limit is not None and len(results) >= limit:
                 break
+        return results
+
+    def search_many(self, trapdoors: List[Tuple[int, bytes]], workers: int = SEARCH_WORKERS, batch_size: int = SEARCH_BATCH_SIZE,
+                    executor: str = "thread") -> List[List[str]]:
+        """
+        Runs a batch of searches on a pool and returns the result lists in input order.
+
+        Identical trapdoors are traversed once and share their result, so nodes hit by several queries of the batch are
+        decrypted only once (distinct keywords never share nodes). Trapdoors are grouped into tasks of `batch_size` to
+        amortize scheduling: larger batches favour throughput, smaller ones latency. `executor` is "thread" (AES releases
+        the GIL) or "process", where forked workers inherit the index instead of receiving a copy of it.
+
+        The pool is created by the first call and reused by the next ones until `close`; it is only replaced when
+        `workers` changes or, for processes, when the index has changed since the workers started.
+        """
+        unique = {}  # trapdoor → position of its result in `results`
+        for index_pos, mask in trapdoors:
+            unique.setdefault((index_pos, bytes(mask)), len(unique))
+        pending = list(unique)
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+        if workers <= 1 or len(batches) <= 1:
+            results = [self.search(trapdoor) for trapdoor in pending]
+        elif executor == "thread":
+            pool = self._pool(executor, workers)
+            batch_results = pool.map(lambda batch: [self.search(trapdoor) for trapdoor in batch], batches)
+            results = [result for batch in batch_results for result in batch]
+        elif executor == "process":
+            pool = self._pool(executor, workers)
+            results = [result for batch in pool.map(_search_batch_in_pool, batches) for result in batch]
+        else:
+            raise ValueError(f"Unknown executor: {executor}")
+
+        return [results[unique[(index_pos, bytes(mask))]] for index_pos, mask in trapdoors]
+
+    def _pool(self, executor: str, workers: int):
+        """
+        Returns the search_many pool of the given kind, creating it (or replacing a stale one) if needed.
+        """
+        with self._pools_lock:
+            generation = self._index_generation if executor == "process" else 0
+            current = self._pools.get(executor)
+            if current is not None and current[1:] == (workers, generation):
+                return current[0]
+            if current is not None:
+                current[0].shutdown(wait=False)  # batches already submitted to it still complete
+
+            if executor == "thread":
+                pool = ThreadPoolExecutor(max_workers=workers)
+            else:
+                if "fork" in multiprocessing.get_all_start_methods():
+                    context, doc_ids = multiprocessing.get_context("fork"), self.doc_ids
+                else:
+                    context, doc_ids = multiprocessing.get_context(), list(self.doc_ids)  # the index is pickled to each worker
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_pool_server,
+                                           initargs=(self.A, self.T, doc_ids, self.tombstones))
+            self._pools[executor] = (pool, workers, generation)
+            return pool
+
+    def close(self):
+        """
+        Stops the compactor and shuts down the search_many pools. The server can still be searched afterwards: a later
+        search_many creates a new pool.
+        """
+        self.stop_compactor()
+        with self._pools_lock:
+            pools, self._pools = self._pools, {}
+        for pool, _, _ in pools.values():
+            pool.shutdown()
 
-            # otherwise, prepare for the next node and update addr to point to the next node in the list
-            addr = int(decrypted["ptr"], 16)
+    def __enter__(self) -> "Server":
+        return self
 
-            # get the key to decrypt the next node
-            key = bytes.fromhex(decrypted["k"])
-            assert len(key) == 16, f"Next key is {len(key)} bytes — expected 16"
-        return results
\ No newline at end of file
+    def __exit__(self, *exc):
+        self.close()
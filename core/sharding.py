@@ -0,0 +1,222 @@
+import os
+import zlib
+import hashlib
+import asyncio
+import multiprocessing
+from typing import Dict, List, Mapping, Optional, Tuple
+from core.client import T_ENTRY_SIZE, T_LABEL_MASK, Client
+from core.crypto import PRF
+from core.node import NODE_CIPHERTEXT_SIZE, NODE_FORMAT_BINARY
+from core.network import NetworkServer, RemoteServer
+from core.server import Server
+from core.store import CuckooTable, SlotStore
+
+# Sharded deployment: the encrypted index is partitioned by keyword across N Server processes, each one serving
+# its part behind a NetworkServer on localhost. The shard of a keyword is a function of its trapdoor label
+# π_{K3}(w) (a PRF output, hence uniform), so a shard learns nothing it would not learn from the same queries
+# on a single server, and the client routes a query with the trapdoor alone. Documents are spread by doc id, which
+# every server already sees in the search results.
+SHARD_START_TIMEOUT = 60  # seconds given to a shard process to open its snapshot and start listening
+
+
+def shard_of(label: int, shards: int) -> int:
+    """
+    Shard holding the list and T entry of the keyword whose trapdoor label is `label`.
+
+    The label is hashed again rather than reduced directly: CuckooTable places it with `label % buckets` (and the high
+    half likewise), so `label % shards` would leave each shard only the cells of its own residue class and double
+    the size of its T.
+    """
+    digest = hashlib.blake2b(label.to_bytes(8, "big"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+def document_shard(doc_id: str, shards: int) -> int:
+    """
+    Shard holding the ciphertext of a document.
+    """
+    return zlib.crc32(doc_id.encode()) % shards
+
+
+def partition_index(client: Client, documents: Mapping[str, bytes], shards: int) -> List[Server]:
+    """
+    Splits the index built by `client` (its A and T) and the encrypted documents into `shards` in-process servers.
+
+    Each list is moved whole to the shard of its keyword: the client walks it from the head ⟨addr, K⟩ it kept when
+    building the index (one AES decryption per node) to collect its node addresses. Nodes keep their global
+    address, so no pointer changes and nothing is re-encrypted. Every shard gets the full doc-id table.
+    """
+    walker = Server()
+    walker.store_index(client.A, client.T, client.doc_ids)
+
+    parts = [Server() for _ in range(shards)]
+    for part in parts:
+        # nodes keep their global address, so every shard has a slot store as large as the client's A; only the
+        # slots of its own lists are written (the snapshot file stays sparse)
+        A = SlotStore(client.capacity, NODE_CIPHERTEXT_SIZE) if client.node_format == NODE_FORMAT_BINARY else {}
+        part.store_index(A, CuckooTable(T_ENTRY_SIZE), client.doc_ids)
+
+    for keyword, head in client.heads.items():
+        label = PRF(client.K3, keyword) & T_LABEL_MASK
+        part = parts[shard_of(label, shards)]
+        part.T[label] = bytes(client.T[label])
+        for addr, *_ in walker._walk(*head):
+            part.A[addr] = bytes(client.A[addr])
+
+    for doc_id, ciphertext in documents.items():
+        parts[document_shard(doc_id, shards)].documents[doc_id] = bytes(ciphertext)
+    return parts
+
+
+def _serve_shard(snapshot_path: str, host: str, ready):
+    """
+    Entry point of a shard process: reopens the shard snapshot and serves it until the process is terminated.
+    The listening port is sent back through `ready`.
+    """
+    async def serve():
+        network_server = await NetworkServer(Server.from_snapshot(snapshot_path), host).start()
+        ready.send(network_server.port)
+        ready.close()
+        await network_server.serve_forever()
+
+    asyncio.run(serve())
+
+
+class ShardCluster:
+    """
+    N local Server processes, one per shard. `deploy` partitions an index and its documents, writes one snapshot per
+    shard under `folder` and starts the processes; `start` alone restarts a cluster from existing snapshots.
+    """
+
+    def __init__(self, folder: str, shards: int, host: str = "127.0.0.1"):
+        self.folder = folder
+        self.shards = shards
+        self.host = host
+        self.processes: List[multiprocessing.Process] = []
+        self.addresses: List[Tuple[str, int]] = []
+
+    def snapshot_path(self, shard: int) -> str:
+        return os.path.join(self.folder, f"shard{shard}.snapshot")
+
+    def deploy(self, client: Client, documents: Mapping[str, bytes]) -> "ShardCluster":
+        os.makedirs(self.folder, exist_ok=True)
+        for shard, server in enumerate(partition_index(client, documents, self.shards)):
+            server.save_snapshot(self.snapshot_path(shard))
+        return self.start()
+
+    def start(self) -> "ShardCluster":
+        context = multiprocessing.get_context("spawn")  # shards must not inherit the client's keys or index
+        pipes = []
+        for shard in range(self.shards):
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_serve_shard, args=(self.snapshot_path(shard), self.host, sender), daemon=True)
+            process.start()
+            sender.close()
+            self.processes.append(process)
+            pipes.append(receiver)
+
+        for shard, receiver in enumerate(pipes):
+            try:
+                if not receiver.poll(SHARD_START_TIMEOUT):
+                    raise RuntimeError(f"Shard {shard} did not start within {SHARD_START_TIMEOUT} seconds")
+                try:
+                    self.addresses.append((self.host, receiver.recv()))
+                except EOFError:
+                    raise RuntimeError(f"Shard {shard} exited before it started listening") from None
+            except BaseException:
+                self.stop()
+                raise
+            finally:
+                receiver.close()
+        return self
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes = []
+        self.addresses = []
+
+    def __enter__(self) -> "ShardCluster":
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class ShardedClient:
+    """
+    Scatter-gather client of a ShardCluster. Each trapdoor goes to the shard of its label. Multi-keyword and batch
+    queries are split by shard and sent to all the shards involved at once, then merged here:
+
+    - search_and / search_or run the conjunction / disjunction of the keywords of each shard on that shard, and the
+      partial results are intersected / merged. Results come in descending doc reference order, as on one server.
+    - fetch_documents fetches every document from its shard and decrypts them locally.
+    """
+
+    def __init__(self, client: Client, addresses: List[Tuple[str, int]], connections: int = 1):
+        self.client = client
+        self.shards = [RemoteServer(host, port, connections) for host, port in addresses]
+
+    async def connect(self) -> "ShardedClient":
+        await asyncio.gather(*(shard.connect() for shard in self.shards))
+        return self
+
+    async def close(self):
+        await asyncio.gather(*(shard.close() for shard in self.shards))
+
+    async def __aenter__(self) -> "ShardedClient":
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _route(self, trapdoor: Tuple[int, bytes]) -> RemoteServer:
+        return self.shards[shard_of(trapdoor[0], len(self.shards))]
+
+    def _group(self, trapdoors: List[Tuple[int, bytes]]) -> Dict[int, List[Tuple[int, bytes]]]:
+        groups = {}  # shard → its trapdoors, in the planner's order
+        for trapdoor in trapdoors:
+            groups.setdefault(shard_of(trapdoor[0], len(self.shards)), []).append(trapdoor)
+        return groups
+
+    def _ordered(self, doc_ids, limit: Optional[int]) -> List[str]:
+        ordered = sorted(doc_ids, key=lambda doc_id: self.client.doc_refs.get(doc_id, -1), reverse=True)
+        return ordered if limit is None else ordered[:limit]
+
+    async def search(self, keyword: str) -> List[str]:
+        trapdoor = self.client.generate_trapdoor(keyword)
+        return await self._route(trapdoor).search(trapdoor)
+
+    async def search_many(self, keywords: List[str]) -> List[List[str]]:
+        trapdoors = self.client.generate_trapdoors(keywords)
+        return list(await asyncio.gather(*(self._route(trapdoor).search(trapdoor) for trapdoor in trapdoors)))
+
+    async def search_and(self, keywords: List[str], limit: Optional[int] = None) -> List[str]:
+        groups = self._group(self.client.plan_query(keywords))
+        if not groups:
+            return []
+        if len(groups) == 1:
+            (shard, trapdoors), = groups.items()
+            return await self.shards[shard].search_and(trapdoors, limit)
+
+        # a limit cannot be pushed down: the first matches of one shard need not match on the others
+        partials = await asyncio.gather(*(self.shards[shard].search_and(trapdoors) for shard, trapdoors in groups.items()))
+        common = set(partials[0]).intersection(*partials[1:])
+        return self._ordered(common, limit)
+
+    async def search_or(self, keywords: List[str], limit: Optional[int] = None) -> List[str]:
+        groups = self._group(self.client.plan_query(keywords))
+        # every shard returns its first `limit` matches in descending reference order, which contain the global ones
+        partials = await asyncio.gather(*(self.shards[shard].search_or(trapdoors, limit) for shard, trapdoors in groups.items()))
+        return self._ordered(set().union(*partials), limit)
+
+    async def fetch_documents(self, doc_ids: List[str], workers: int = 1, lazy: bool = False) -> Mapping:
+        groups = {}
+        for doc_id in doc_ids:
+            groups.setdefault(document_shard(doc_id, len(self.shards)), []).append(doc_id)
+        parts = await asyncio.gather(*(self.shards[shard].fetch_documents(ids) for shard, ids in groups.items()))
+        ciphertexts = {}
+        for part in parts:
+            ciphertexts.update(part)
+        return self.client.decrypt_documents(ciphertexts, workers=workers, lazy=lazy)
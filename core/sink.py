@@ -0,0 +1,188 @@
+import os
+import mmap
+from typing import Dict, List, Mapping, Protocol, Tuple, Union
+from core.node import NODE_FORMAT_BINARY, NODE_CIPHERTEXT_SIZE
+from core.segment import SegmentStore
+from core.snapshot import RECORD, save_snapshot
+from core.store import CuckooTable, SlotStore
+
+# Client.build_secure_index does not keep the encrypted index: it hands every finished list to a sink, nodes first and
+# then the T entry that makes them reachable. The doc ids of the batch are registered before either, so a sink that
+# serves searches while it receives the index never exposes a partial list nor a node whose reference it cannot
+# resolve. Sinks:
+#   MemorySink           A and T kept in the client process (the default, and the original behavior)
+#   Server               an in-process server, which then holds the only copy of the index
+#   SnapshotSink         a snapshot file, assembled from an on-disk spool when the sink is closed
+#   network.RemoteSink   a NetworkServer started with accept_uploads=True
+# Apart from MemorySink, they also have store_documents, so core.pipeline.ingest can upload a whole corpus through them.
+
+
+class IndexSink(Protocol):
+    def open_index(self, node_format: str, capacity: int, entry_size: int):
+        """
+        Starts a new, empty index whose array A has `capacity` node addresses. Called once, by the first
+        build_secure_index of a new client (Client.open_sink).
+        """
+
+    def grow_index(self, capacity: int):
+        """
+        A has grown to `capacity` addresses (a new address epoch); existing nodes keep their address. Also called
+        instead of open_index by a client restored with load_keys, to resume the index the sink already holds.
+        """
+
+    def begin_batch(self, doc_ids: List[str]):
+        """
+        Starts a build: `doc_ids` are the documents it indexes, appended to the doc-id table in order before any of
+        their nodes is stored.
+        """
+
+    def store_nodes(self, nodes: List[Tuple[int, bytes]]):
+        """
+        Stores encrypted nodes (addr, ciphertext) at their address in A.
+        """
+
+    def store_entry(self, label: int, entry: bytes):
+        """
+        Stores (or replaces) the masked T entry of a keyword, after the nodes it points to.
+        """
+
+    def commit_index(self):
+        """
+        Ends a build, once every node and entry of the batch has been stored.
+        """
+
+
+class MemorySink:
+    """
+    Keeps A and T in the client process: client.A and client.T can then be handed to Server.store_index or partitioned
+    by core.sharding. The doc-id table is the client's own list.
+    """
+
+    def __init__(self):
+        self.A: Union[SlotStore, Dict[int, bytes]] = {}
+        self.T = None
+
+    def open_index(self, node_format: str, capacity: int, entry_size: int):
+        # fixed-width binary nodes live in a slot store, variable-size JSON nodes in a dict
+        self.A = SlotStore(capacity, NODE_CIPHERTEXT_SIZE) if node_format == NODE_FORMAT_BINARY else {}
+        self.T = CuckooTable(entry_size)
+
+    def grow_index(self, capacity: int):
+        if self.T is None:
+            raise ValueError("A MemorySink cannot resume an index it does not hold: pass the sink holding it to Client")
+        if isinstance(self.A, SlotStore):
+            self.A.grow(capacity)
+
+    def begin_batch(self, doc_ids: List[str]):
+        pass
+
+    def store_nodes(self, nodes: List[Tuple[int, bytes]]):
+        for addr, node in nodes:
+            self.A[addr] = node
+
+    def store_entry(self, label: int, entry: bytes):
+        self.T[label] = entry
+
+    def commit_index(self):
+        pass
+
+
+class SnapshotSink:
+    """
+    Writes the index to a snapshot file (the format of Server.save_snapshot) without holding A in memory: nodes are
+    appended to a spool file as they arrive and only placed in their slots by `close`, through a temporary
+    memory-mapped file. T (one entry per keyword, like the client's heads) and the doc-id table are kept in memory.
+    Documents given to store_documents are spooled to a segment and written to the snapshot as well.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.node_format = NODE_FORMAT_BINARY
+        self.capacity = 0
+        self.T = None
+        self.doc_ids: List[str] = []
+        self.documents = None  # segment spooling the encrypted documents, created by the first store_documents
+        self._spool = None
+
+    def open_index(self, node_format: str, capacity: int, entry_size: int):
+        self.node_format = node_format
+        self.capacity = capacity
+        self.T = CuckooTable(entry_size)
+        self.doc_ids = []
+        self._spool = open(self.path + ".nodes", "wb")
+
+    def grow_index(self, capacity: int):
+        if self._spool is None:
+            raise ValueError("A SnapshotSink writes a new snapshot: it cannot resume an existing index")
+        self.capacity = capacity
+
+    def begin_batch(self, doc_ids: List[str]):
+        self.doc_ids.extend(doc_ids)
+
+    def store_nodes(self, nodes: List[Tuple[int, bytes]]):
+        self._spool.write(b"".join(RECORD.pack(addr, len(node)) + bytes(node) for addr, node in nodes))
+
+    def store_entry(self, label: int, entry: bytes):
+        self.T[label] = entry
+
+    def commit_index(self):
+        pass
+
+    def store_documents(self, encrypted_docs: Mapping[str, bytes]):
+        if self.documents is None:
+            self.documents = SegmentStore(self.path + ".docs")
+        self.documents.update(encrypted_docs)
+
+    def _spooled_nodes(self):
+        with open(self.path + ".nodes", "rb") as f:
+            while True:
+                header = f.read(RECORD.size)
+                if len(header) < RECORD.size:
+                    return
+                addr, length = RECORD.unpack(header)
+                yield addr, f.read(length)
+
+    def close(self):
+        """
+        Assembles the snapshot and removes the spool files. Nothing is written if the index was never opened.
+        """
+        if self._spool is None:
+            return
+        self._spool.close()
+        self._spool = None
+        documents = self.documents if self.documents is not None else {}
+
+        if self.node_format != NODE_FORMAT_BINARY:
+            # legacy JSON nodes have no fixed width: they are placed in a dict, as in the snapshot reader
+            save_snapshot(self.path, dict(self._spooled_nodes()), self.T, self.doc_ids, documents)
+        else:
+            cells_size = self.capacity * NODE_CIPHERTEXT_SIZE
+            with open(self.path + ".cells", "w+b") as f:
+                f.truncate(cells_size + (self.capacity + 7) // 8)
+                buffer = mmap.mmap(f.fileno(), 0)
+            view = memoryview(buffer)
+            cells, bitmap = view[:cells_size], view[cells_size:]
+            A = SlotStore(self.capacity, NODE_CIPHERTEXT_SIZE, cells, bitmap)
+            try:
+                for addr, node in self._spooled_nodes():
+                    A[addr] = node
+                save_snapshot(self.path, A, self.T, self.doc_ids, documents)
+            finally:
+                # every view of the mapping must be released before it can be closed
+                for exported in (A.cells, A.bitmap, cells, bitmap, view):
+                    exported.release()
+                buffer.close()
+                os.remove(self.path + ".cells")
+
+        os.remove(self.path + ".nodes")
+        if self.documents is not None:
+            self.documents.close()
+            for suffix in (".seg", ".idx"):
+                os.remove(self.path + ".docs" + suffix)
+            self.documents = None
+
+    def __enter__(self) -> "SnapshotSink":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
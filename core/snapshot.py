@@ -0,0 +1,277 @@
+import os
+import json
+import mmap
+import struct
+from typing import Dict, Iterable, Iterator, Mapping, MutableMapping, Set, Tuple, Union
+
+from core.store import CuckooTable, SlotStore, TAG
+
+# Snapshot layout: MAGIC | u32 metadata length | metadata (JSON) | page-aligned binary regions.
+# The metadata records the offset and length of every region, so opening a snapshot only parses the header
+# and maps the file; index cells, doc ids and ciphertexts are faulted in by the OS when a search touches them.
+MAGIC = b"SSEIDX\x00\x01"
+HEADER = struct.Struct(">8sI")
+PAGE_SIZE = 4096
+SPARSE_MIN_SIZE = 1024 * 1024  # regions at least this large are written sparse: their all-zero pages are left as holes
+
+OFFSET = struct.Struct(">Q")   # entries of the offset tables of string/blob regions
+RECORD = struct.Struct(">II")  # (addr, length) prefix of each node of a dict-backed A (legacy JSON nodes)
+REF = struct.Struct(">I")      # entries of the tombstone region (references of deleted documents)
+
+
+class _BlobTable:
+    """
+    Read-only sequence of variable-length blobs stored as an offset table (n + 1 big-endian u64) and a data region.
+    """
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self.offsets = offsets
+        self.blob = blob
+        self.size = len(offsets) // OFFSET.size - 1
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, i: int) -> memoryview:
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        start, = OFFSET.unpack_from(self.offsets, i * OFFSET.size)
+        end, = OFFSET.unpack_from(self.offsets, (i + 1) * OFFSET.size)
+        return self.blob[start:end]
+
+
+class SnapshotDocIds:
+    """
+    Lazy doc-id table (reference → doc id) backed by the snapshot file.
+    Doc ids appended after the snapshot was opened (a client extending the index) are kept in memory after it.
+    """
+
+    def __init__(self, table: _BlobTable):
+        self.table = table
+        self.added = []  # doc ids appended since the snapshot was opened
+
+    def __len__(self) -> int:
+        return len(self.table) + len(self.added)
+
+    def __getitem__(self, ref: int) -> str:
+        if ref >= len(self.table):
+            return self.added[ref - len(self.table)]
+        return str(self.table[ref], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for ref in range(len(self)):
+            yield self[ref]
+
+    def extend(self, doc_ids: Iterable[str]):
+        self.added.extend(doc_ids)
+
+
+class SnapshotDocuments(MutableMapping):
+    """
+    Lazy mapping doc id → encrypted document backed by the snapshot file. Doc ids are stored sorted,
+    so a lookup is a binary search over the mapped id table and returns a memoryview of the ciphertext.
+    Documents added or removed after the snapshot was opened are tracked in memory on top of the file.
+    """
+
+    def __init__(self, ids: _BlobTable, ciphertexts: _BlobTable):
+        self.ids = ids
+        self.ciphertexts = ciphertexts
+        self.added = {}       # documents stored after the snapshot was opened
+        self.removed = set()  # snapshot documents deleted since then
+
+    def _find(self, doc_id: str) -> int:
+        key = doc_id.encode()
+        lo, hi = 0, len(self.ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ids[mid].tobytes() < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.ids) and self.ids[lo] == key and doc_id not in self.removed:
+            return lo
+        return -1
+
+    def __getitem__(self, doc_id: str) -> memoryview:
+        if doc_id in self.added:
+            return self.added[doc_id]
+        pos = self._find(doc_id)
+        if pos < 0:
+            raise KeyError(doc_id)
+        return self.ciphertexts[pos]
+
+    def __setitem__(self, doc_id: str, ciphertext: bytes):
+        self.added[doc_id] = ciphertext
+
+    def __delitem__(self, doc_id: str):
+        if doc_id in self.added:
+            del self.added[doc_id]
+        elif self._find(doc_id) >= 0:
+            self.removed.add(doc_id)
+        else:
+            raise KeyError(doc_id)
+
+    def __contains__(self, doc_id) -> bool:
+        return isinstance(doc_id, str) and (doc_id in self.added or self._find(doc_id) >= 0)
+
+    def __len__(self) -> int:
+        # a document stored again after being opened from the file is counted once
+        return len(self.ids) - len(self.removed) + sum(1 for doc_id in self.added if self._find(doc_id) < 0)
+
+    def __iter__(self) -> Iterator[str]:
+        for pos in range(len(self.ids)):
+            doc_id = str(self.ids[pos], "utf-8")
+            if doc_id not in self.removed and doc_id not in self.added:
+                yield doc_id
+        yield from self.added
+
+
+def _blob_regions(blobs) -> Tuple[bytes, list]:
+    """
+    Builds the offset table of a list of blobs; the blobs themselves are written without being concatenated.
+    """
+    offsets = bytearray(OFFSET.pack(0))
+    total = 0
+    for blob in blobs:
+        total += len(blob)
+        offsets += OFFSET.pack(total)
+    return bytes(offsets), blobs
+
+
+def _write_sparse(f, buffer):
+    """
+    Writes a buffer, seeking over its all-zero pages so that mostly empty slot stores (e.g. the A of a shard, which
+    spans every address of the index) become sparse regions of the file. Runs of non-zero pages are written at once.
+    """
+    view = memoryview(buffer).cast("B")
+    if len(view) < SPARSE_MIN_SIZE:
+        f.write(view)
+        return
+    zero = bytes(PAGE_SIZE)
+    run_start = None  # start of the pending run of non-zero pages
+    for start in range(0, len(view), PAGE_SIZE):
+        page = view[start:start + PAGE_SIZE]
+        if page == zero[:len(page)]:
+            if run_start is not None:
+                f.write(view[run_start:start])
+                run_start = None
+            f.seek(len(page), os.SEEK_CUR)
+        elif run_start is None:
+            run_start = start
+    if run_start is not None:
+        f.write(view[run_start:])
+
+
+def save_snapshot(path: str, A: Union[SlotStore, Dict[int, bytes]], T: CuckooTable, doc_ids, documents: Mapping[str, bytes],
+                  tombstones: Set[int] = frozenset()):
+    """
+    Writes the encrypted index (A, T, doc-id table, tombstones) and the encrypted documents to a single snapshot file.
+    The file is written next to its destination and renamed, so an existing snapshot is replaced atomically.
+    """
+    if not isinstance(T, CuckooTable):
+        raise ValueError("Only a CuckooTable T can be saved in a snapshot (Server.store_index converts a dict T)")
+    regions = []  # (name, list of buffers)
+
+    if isinstance(A, SlotStore):
+        a_meta = {"kind": "slots", "capacity": A.capacity, "cell_size": A.cell_size, "count": A.count}
+        regions.append(("A.cells", [A.cells]))
+        regions.append(("A.bitmap", [A.bitmap]))
+    else:
+        a_meta = {"kind": "records", "count": len(A)}
+        regions.append(("A.records", [RECORD.pack(addr, len(node)) + bytes(node) for addr, node in A.items()]))
+
+    t_meta = {"kind": "cuckoo", "buckets": T.buckets, "entry_size": T.entry_size, "count": T.store.count}
+    regions.append(("T.cells", [T.store.cells]))
+    regions.append(("T.bitmap", [T.store.bitmap]))
+
+    id_offsets, id_blobs = _blob_regions([doc_id.encode() for doc_id in doc_ids])
+    regions.append(("refs.offsets", [id_offsets]))
+    regions.append(("refs.blob", id_blobs))
+
+    regions.append(("tombstones", [b"".join(REF.pack(ref) for ref in sorted(tombstones))]))
+
+    sorted_ids = sorted(documents, key=lambda doc_id: doc_id.encode())
+    name_offsets, name_blobs = _blob_regions([doc_id.encode() for doc_id in sorted_ids])
+    doc_offsets, doc_blobs = _blob_regions([documents[doc_id] for doc_id in sorted_ids])
+    regions.append(("docs.ids.offsets", [name_offsets]))
+    regions.append(("docs.ids.blob", name_blobs))
+    regions.append(("docs.offsets", [doc_offsets]))
+    regions.append(("docs.blob", doc_blobs))
+
+    layout = {}
+    position = 0
+    for name, buffers in regions:
+        length = sum(len(buffer) for buffer in buffers)
+        layout[name] = [position, length]
+        position += -(-length // PAGE_SIZE) * PAGE_SIZE
+
+    # the metadata holds the region offsets, which depend on where the metadata ends: grow the header until it fits
+    data_start = PAGE_SIZE
+    while True:
+        placed = {name: [offset + data_start, length] for name, (offset, length) in layout.items()}
+        meta = json.dumps({"A": a_meta, "T": t_meta, "regions": placed}).encode()
+        needed = -(-(HEADER.size + len(meta)) // PAGE_SIZE) * PAGE_SIZE
+        if needed <= data_start:
+            break
+        data_start = needed
+    layout = placed
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(meta)))
+        f.write(meta)
+        for name, buffers in regions:
+            f.seek(layout[name][0])
+            for buffer in buffers:
+                _write_sparse(f, buffer)
+        f.truncate(max([data_start] + [offset + length for offset, length in layout.values()]))
+    os.replace(tmp_path, path)
+
+
+def open_snapshot(path: str):
+    """
+    Maps a snapshot file and returns (A, T, doc_ids, documents, tombstones). Apart from the header, only the (small)
+    tombstone set is read here: the other structures are views over the mapping.
+    The mapping is copy-on-write: later updates to the index modify process memory, never the snapshot file.
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    magic, meta_length = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not an index snapshot")
+    meta = json.loads(buffer[HEADER.size:HEADER.size + meta_length])
+
+    view = memoryview(buffer)
+
+    def region(name: str) -> memoryview:
+        offset, length = meta["regions"][name]
+        return view[offset:offset + length]
+
+    a_meta = meta["A"]
+    if a_meta["kind"] == "slots":
+        A = SlotStore(a_meta["capacity"], a_meta["cell_size"], region("A.cells"), region("A.bitmap"), a_meta["count"])
+    else:
+        # legacy JSON nodes have no fixed width, so they are loaded eagerly into a dict
+        A = {}
+        records = region("A.records")
+        pos = 0
+        while pos < len(records):
+            addr, length = RECORD.unpack_from(records, pos)
+            pos += RECORD.size
+            A[addr] = records[pos:pos + length].tobytes()
+            pos += length
+
+    t_meta = meta["T"]
+    buckets, entry_size = t_meta["buckets"], t_meta["entry_size"]
+    store = SlotStore(2 * buckets, TAG.size + entry_size, region("T.cells"), region("T.bitmap"), t_meta["count"])
+    T = CuckooTable(entry_size, buckets, store)
+
+    doc_ids = SnapshotDocIds(_BlobTable(region("refs.offsets"), region("refs.blob")))
+    documents = SnapshotDocuments(
+        _BlobTable(region("docs.ids.offsets"), region("docs.ids.blob")),
+        _BlobTable(region("docs.offsets"), region("docs.blob")),
+    )
+    dead = region("tombstones")
+    tombstones = {REF.unpack_from(dead, pos)[0] for pos in range(0, len(dead), REF.size)}
+    return A, T, doc_ids, documents, tombstones
@@ -0,0 +1,200 @@
+import struct
+from typing import Iterator, Optional, Tuple
+from core.metrics import metrics
+
+
+class SlotStore:
+    """
+    Slot-addressed storage for the encrypted index: one preallocated buffer of `capacity` fixed-size cells plus an
+    occupancy bitmap. It exposes the same get/put interface as the dicts it replaces (addr in store, store[addr],
+    store.get(addr), store[addr] = value), but reads return zero-copy memoryview slices of the buffer.
+    """
+
+    def __init__(self, capacity: int, cell_size: int, cells=None, bitmap=None, count: int = 0):
+        self.capacity = capacity
+        self.cell_size = cell_size
+
+        # `cells` and `bitmap` may be any writable buffer (bytearray, mmap, ...); fresh ones are allocated by default
+        self.cells = memoryview(cells if cells is not None else bytearray(capacity * cell_size))
+        self.bitmap = memoryview(bitmap if bitmap is not None else bytearray((capacity + 7) // 8))
+        self.count = count  # number of occupied slots
+
+    def __reduce__(self):
+        # buffer views cannot be pickled: ship a copy of the cells and bitmap
+        return SlotStore, (self.capacity, self.cell_size, bytearray(self.cells), bytearray(self.bitmap), self.count)
+
+    def grow(self, capacity: int):
+        """
+        Enlarges the store in place to `capacity` slots. Occupied slots keep their address, so pointers to them stay
+        valid; the cells and bitmap are copied into new, larger buffers.
+        """
+        if capacity <= self.capacity:
+            return
+        cells = bytearray(capacity * self.cell_size)
+        cells[:len(self.cells)] = self.cells
+        bitmap = bytearray((capacity + 7) // 8)
+        bitmap[:len(self.bitmap)] = self.bitmap
+        self.cells, self.bitmap, self.capacity = memoryview(cells), memoryview(bitmap), capacity
+
+    def __contains__(self, addr: int) -> bool:
+        return 0 <= addr < self.capacity and bool(self.bitmap[addr >> 3] & (1 << (addr & 7)))
+
+    def __getitem__(self, addr: int) -> memoryview:
+        if addr not in self:
+            raise KeyError(addr)
+        start = addr * self.cell_size
+        return self.cells[start:start + self.cell_size]
+
+    def get(self, addr: int, default=None) -> Optional[memoryview]:
+        if addr not in self:
+            return default
+        start = addr * self.cell_size
+        return self.cells[start:start + self.cell_size]
+
+    def __setitem__(self, addr: int, value: bytes):
+        if not 0 <= addr < self.capacity:
+            raise IndexError(f"Slot {addr} is outside the store capacity {self.capacity}")
+        if len(value) != self.cell_size:
+            raise ValueError(f"Value length {len(value)} does not match cell size {self.cell_size}")
+
+        start = addr * self.cell_size
+        self.cells[start:start + self.cell_size] = value
+        if addr not in self:
+            self.bitmap[addr >> 3] |= 1 << (addr & 7)
+            self.count += 1
+
+    def __delitem__(self, addr: int):
+        if addr not in self:
+            raise KeyError(addr)
+        self.bitmap[addr >> 3] &= ~(1 << (addr & 7)) & 0xFF
+        self.count -= 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def keys(self) -> Iterator[int]:
+        """
+        Iterates over the occupied slots, skipping empty bitmap bytes at once.
+        """
+        for byte_pos, byte in enumerate(self.bitmap):
+            if byte:
+                for bit in range(8):
+                    if byte & (1 << bit):
+                        yield (byte_pos << 3) | bit
+
+    __iter__ = keys
+
+    def values(self) -> Iterator[memoryview]:
+        for addr in self.keys():
+            yield self[addr]
+
+    def items(self) -> Iterator[Tuple[int, memoryview]]:
+        for addr in self.keys():
+            yield addr, self[addr]
+
+
+CUCKOO_MIN_BUCKETS = 16
+CUCKOO_MAX_KICKS = 64  # evictions tried before an insertion gives up and the table is rebuilt larger
+TAG = struct.Struct(">Q")
+
+
+class CuckooTable:
+    """
+    Cuckoo hash table for the lookup table T, keyed by the 64-bit trapdoor label π_{K3}(w). Each label has one
+    candidate cell in each half of the table and every cell stores the label as a tag next to the entry, so a lookup
+    costs at most two probes whatever the table size, and a lookup never returns the entry of another keyword.
+    The table keeps its load under 50% (the limit for two single-cell choices) and is rebuilt twice as large when an
+    insertion fails, so memory is proportional to the vocabulary.
+    """
+
+    def __init__(self, entry_size: int, buckets: int = CUCKOO_MIN_BUCKETS, store: Optional[SlotStore] = None):
+        self.entry_size = entry_size
+        self.buckets = buckets  # cells per half of the table
+        self.store = store if store is not None else SlotStore(2 * buckets, TAG.size + entry_size)
+
+    def _positions(self, label: int) -> Tuple[int, int]:
+        # labels are PRF outputs: their low and high 32 bits are independent hashes
+        return (label & 0xFFFFFFFF) % self.buckets, self.buckets + (label >> 32) % self.buckets
+
+    def get(self, label: int, default=None) -> Optional[memoryview]:
+        for pos in self._positions(label):
+            cell = self.store.get(pos)
+            if cell is not None and TAG.unpack_from(cell)[0] == label:
+                return cell[TAG.size:]
+        return default
+
+    def __getitem__(self, label: int) -> memoryview:
+        entry = self.get(label)
+        if entry is None:
+            raise KeyError(label)
+        return entry
+
+    def __contains__(self, label: int) -> bool:
+        return self.get(label) is not None
+
+    def __setitem__(self, label: int, entry: bytes):
+        if len(entry) != self.entry_size:
+            raise ValueError(f"Entry length {len(entry)} does not match entry size {self.entry_size}")
+        record = TAG.pack(label) + bytes(entry)
+
+        for pos in self._positions(label):
+            cell = self.store.get(pos)
+            if cell is not None and TAG.unpack_from(cell)[0] == label:
+                self.store[pos] = record  # update in place
+                return
+
+        if self.store.count + 1 > self.buckets:
+            self._rebuild(self.buckets * 2, [record])
+            return
+        leftover = self._insert(record)
+        if leftover is not None:
+            self._rebuild(self.buckets * 2, [leftover])
+
+    def _insert(self, record: bytes) -> Optional[bytes]:
+        """
+        Inserts a record, evicting occupants to their alternative cell. Returns the record left homeless when
+        CUCKOO_MAX_KICKS evictions were not enough (None on success).
+        """
+        pos = self._positions(TAG.unpack_from(record)[0])[0]
+        for kicks in range(CUCKOO_MAX_KICKS):
+            if pos not in self.store:
+                self.store[pos] = record
+                metrics.observe("t.insert_kicks", kicks)
+                return None
+            evicted = self.store[pos].tobytes()
+            self.store[pos] = record
+            record = evicted
+            first, second = self._positions(TAG.unpack_from(record)[0])
+            pos = second if pos == first else first
+        return record
+
+    def _rebuild(self, buckets: int, pending: list):
+        metrics.count("t.rebuilds")
+        records = [cell.tobytes() for cell in self.store.values()] + pending
+        while True:
+            self.buckets = buckets
+            self.store = SlotStore(2 * buckets, TAG.size + self.entry_size)
+            if all(self._insert(record) is None for record in records):
+                return
+            buckets *= 2
+
+    def __delitem__(self, label: int):
+        for pos in self._positions(label):
+            cell = self.store.get(pos)
+            if cell is not None and TAG.unpack_from(cell)[0] == label:
+                del self.store[pos]
+                return
+        raise KeyError(label)
+
+    def __len__(self) -> int:
+        return self.store.count
+
+    def items(self) -> Iterator[Tuple[int, memoryview]]:
+        for cell in self.store.values():
+            yield TAG.unpack_from(cell)[0], cell[TAG.size:]
+
+    def keys(self) -> Iterator[int]:
+        for label, _ in self.items():
+            yield label
+
+    __iter__ = keys
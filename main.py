@@ -1,6 +1,9 @@
 from utils.generators import generate_documents
 from core.client import Client
+from core.extractor import MULTI_FIELD_EXTRACTOR
 from core.server import Server
+from core.pipeline import ingest
+from core.metrics import metrics
 import os
 import time
 import csv
@@ -10,60 +13,72 @@ TOTAL = 1000
 BATCH_SIZE = 10_000
 DOCUMENTS_FOLDER = "data/documents"
 ENCRYPTED_FOLDER = "data/encrypted_docs"
+SERVER_DOCUMENTS = "data/server/documents"  # segment file (.seg + .idx) where the server keeps the encrypted documents
 SUMMARY_FILE = "data/summary_times.csv"
-
-def main():
-    os.makedirs(DOCUMENTS_FOLDER, exist_ok=True)
-    os.makedirs(ENCRYPTED_FOLDER, exist_ok=True)
-
-    client = Client()
-    server = Server()
-
+SNAPSHOT_FILE = "data/index.snapshot"   # encrypted index + documents, reopened by later runs (delete to rebuild)
+KEYS_FILE = "data/client_keys.json"     # client secret keys matching the snapshot
+DECRYPT_WORKERS = os.cpu_count() or 1   # processes decrypting large result sets
+DOCUMENT_CACHE_BYTES = 64 * 1024 * 1024 # decrypted documents kept between queries
+EXTRACT_WORKERS = os.cpu_count() or 1   # processes extracting keywords while indexing
+METRICS_FILE = "data/metrics"           # <METRICS_FILE>.json / .prom written on exit when SSE_METRICS=1
+
+def build_index(client: Client, server: Server):
     print(f"Generating {TOTAL} documents...")
     start_gen = time.time()
     generate_documents(TOTAL, output_folder=DOCUMENTS_FOLDER)
     end_gen = time.time()
     generation_time = end_gen - start_gen
 
-    print("Loading all documents...")
-    documents, keywords_map = client.load_documents_and_keywords(DOCUMENTS_FOLDER)
-    all_doc_ids = list(documents.keys())
-
-    total_index_time = 0
-
-    for i in range(0, TOTAL, BATCH_SIZE):
-        current_batch_size = min(BATCH_SIZE, TOTAL - i)
-        batch_num = (i // BATCH_SIZE) + 1
-        print(f"Processing batch {batch_num} with {current_batch_size} documents")
-
-        batch_doc_ids = all_doc_ids[i:i + current_batch_size]
-        batch_documents = {doc_id: documents[doc_id] for doc_id in batch_doc_ids}
-        batch_keywords = {doc_id: keywords_map[doc_id] for doc_id in batch_doc_ids}
-
-        # Encrypt documents
-        encrypted_docs = client.encrypt_documents(batch_documents)
-
-        # Build secure index
-        start_idx = time.time()
-        client.build_secure_index(batch_keywords)
-        end_idx = time.time()
-        total_index_time += end_idx - start_idx
-
-        # Store in server
-        server.store_documents(encrypted_docs)
-        server.store_index(client.A, client.T)
+    print(f"Indexing documents in batches of {BATCH_SIZE}...")
+    stats = ingest(client, server, DOCUMENTS_FOLDER, batch_size=BATCH_SIZE, encrypted_folder=ENCRYPTED_FOLDER,
+                   extract_workers=EXTRACT_WORKERS)
+    total_index_time = stats["index_time"]
+    print(f"Indexed {stats['documents']} documents ({stats['pairs']} keyword pairs)")
 
     print("Processing completed!")
     print(f"Total document generation time: {generation_time:.2f} seconds")
     print(f"Total indexing time: {total_index_time:.2f} seconds")
 
+    server.save_snapshot(SNAPSHOT_FILE)
+    client.save_keys(KEYS_FILE)
+    return generation_time, total_index_time
+
+def main():
+    os.makedirs(DOCUMENTS_FOLDER, exist_ok=True)
+    os.makedirs(ENCRYPTED_FOLDER, exist_ok=True)
+
+    if os.environ.get("SSE_METRICS") == "1":
+        metrics.enable()
+
+    # indexes every field: diseases as before, plus "name:...", "age:...", "neighborhood:..." and "phone:..."
+    if os.path.exists(SNAPSHOT_FILE) and os.path.exists(KEYS_FILE):
+        start_open = time.perf_counter()
+        server = Server.from_snapshot(SNAPSHOT_FILE)
+        # the reopened server stays the sink: a later batch extends its index instead of replacing it
+        client = Client(document_cache_bytes=DOCUMENT_CACHE_BYTES, extractor=MULTI_FIELD_EXTRACTOR, sink=server)
+        client.load_keys(KEYS_FILE)
+        print(f"Reopened index snapshot in {time.perf_counter() - start_open:.4f} seconds")
+        generation_time, total_index_time = 0.0, 0.0
+    else:
+        server = Server(documents_path=SERVER_DOCUMENTS)
+        # the server is the client's sink: the index is streamed into it as it is built, the client keeps no copy
+        client = Client(document_cache_bytes=DOCUMENT_CACHE_BYTES, extractor=MULTI_FIELD_EXTRACTOR, sink=server)
+        generation_time, total_index_time = build_index(client, server)
+
     while True:
-        q = input("Search word (or 'exit'): ").strip().lower()
+        q = input("Search word or field ('neighborhood: centro'), 'a and b', 'a or b' (or 'exit'): ").strip().lower()
         if q == 'exit':
             break
 
-        trapdoor = client.generate_trapdoor(q)
-        
+        if " and " in q:
+            trapdoors = client.plan_query([client.extractor.normalize_query(w) for w in q.split(" and ")])
+            run_search = lambda: server.search_and(trapdoors)
+        elif " or " in q:
+            trapdoors = client.plan_query([client.extractor.normalize_query(w) for w in q.split(" or ")])
+            run_search = lambda: server.search_or(trapdoors)
+        else:
+            trapdoor = client.generate_trapdoor(client.extractor.normalize_query(q))
+            run_search = lambda: server.search(trapdoor)
 
         print("Measuring average search time over 50 runs...")
         durations = []
@@ -71,7 +86,7 @@ def main():
 
         for _ in range(50):
             start = time.perf_counter()
-            result = server.search(trapdoor)
+            result = run_search()
             durations.append(time.perf_counter() - start)
             matches = result  # same for all runs
 
@@ -82,9 +97,10 @@ def main():
             print(f"Matching documents: {', '.join(matches)}")
             choice = input("Do you want to decrypt and view the matching documents? (y/n): ").strip().lower()
             if choice == 'y':
-                for doc_id in matches:
-                    decrypted = client.decrypt_document(server.documents[doc_id])
-                    print(f"Document {doc_id}:\n{decrypted}")
+                decrypted = client.decrypt_documents({doc_id: server.documents[doc_id] for doc_id in matches},
+                                                     workers=DECRYPT_WORKERS)
+                for doc_id, text in decrypted.items():
+                    print(f"Document {doc_id}:\n{text}")
         else:
             print("No documents matched the search.")
 
@@ -96,5 +112,12 @@ def main():
             row = [f"{generation_time:.3f}", f"{total_index_time:.3f}", f"{search_duration:.3f}"]
             writer.writerow(row)
 
+    if metrics.enabled:
+        with open(METRICS_FILE + ".json", "w") as f:
+            f.write(metrics.to_json())
+        with open(METRICS_FILE + ".prom", "w") as f:
+            f.write(metrics.to_prometheus())
+        print(f"Metrics saved to: {METRICS_FILE}.json and {METRICS_FILE}.prom")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+from core.client import Client
+from core.network import NetworkServer, RemoteSink
+from core.server import Server
+
+
+class _SearchingServer(Server):
+    """
+    Server that runs searches when a build commits, i.e. after every node and T entry of the batch was stored.
+    """
+
+    def __init__(self, trapdoors):
+        super().__init__()
+        self.trapdoors = trapdoors
+        self.seen = []
+
+    def commit_index(self):
+        trapdoors = self.trapdoors()
+        self.seen.append((self.search(trapdoors[0]), self.search_and(trapdoors), self.search_or(trapdoors)))
+        super().commit_index()
+
+
+def _batches():
+    first = {f"a{i}": ["flu", "fever"] for i in range(20)}
+    second = {f"b{i}": ["flu", "fever"] for i in range(10)}
+    return first, second
+
+
+def test_search_between_entries_and_commit():
+    client = None
+    server = _SearchingServer(lambda: client.generate_trapdoors(["flu", "fever"]))
+    client = Client(sink=server)
+    first, second = _batches()
+    client.build_secure_index(first)
+    client.build_secure_index(second)
+
+    single, both, either = server.seen[-1]
+    assert sorted(single) == sorted([*first, *second])
+    assert sorted(both) == sorted(either) == sorted(single)
+
+
+def test_remote_search_between_entries_and_commit():
+    client = None
+    server = _SearchingServer(lambda: client.generate_trapdoors(["flu", "fever"]))
+    loop = asyncio.new_event_loop()
+    network_server = loop.run_until_complete(NetworkServer(server, accept_uploads=True).start())
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    try:
+        with RemoteSink("127.0.0.1", network_server.port) as sink:
+            client = Client(sink=sink)
+            first, second = _batches()
+            client.build_secure_index(first)
+            client.build_secure_index(second)
+        single, _, _ = server.seen[-1]
+        assert sorted(single) == sorted([*first, *second])
+    finally:
+        asyncio.run_coroutine_threadsafe(network_server.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
@@ -1,10 +1,13 @@
 import os
+import bisect
 import random
+import itertools
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from faker import Faker
-from typing import List
+from typing import Iterable, List, Tuple
+from core.packed import PACK_SUFFIX, write_packed_documents
 
-
-fake = Faker('pt_BR')
 DISEASES = [
     "diabetes", "hipertensao", "asma", "covid", "bronquite", "cancer",
     "dengue", "gripe", "hepatite", "alergia"]
@@ -23,11 +26,58 @@ DISEASE_PROPORTIONS = {
     "alergia": 0.01
 }
 
+NAME_POOL_SIZE = 10_000          # Faker values are drawn once per pool, then sampled for every document
+NEIGHBORHOOD_POOL_SIZE = 1_000
+PHONE_POOL_SIZE = 10_000
+POOL_SEED = 0                    # seed of the pools used by the generators that take no seed
+CORPUS_CHUNK_SIZE = 10_000       # documents generated by one task of generate_corpus (one shard in the sharded layouts)
+
+LAYOUT_FILES = "files"      # one doc<i>.txt per document in the output folder
+LAYOUT_SHARDED = "sharded"  # one subfolder shard<j> of doc<i>.txt per chunk
+LAYOUT_PACKED = "packed"    # one packed file shard<j>.pack per chunk (see core.packed.write_packed_documents)
+
+DISTRIBUTION_ZIPF = "zipf"                # P(rank r) ∝ 1 / r^s over the vocabulary
+DISTRIBUTION_UNIFORM = "uniform"
+DISTRIBUTION_PROPORTIONS = "proportions"  # DISEASE_PROPORTIONS (the vocabulary is DISEASES)
+
+_corpus_state = None  # pools and keyword sampler of the generate_corpus workers
+
+@lru_cache(maxsize=4)
+def sample_pools(seed: int = POOL_SEED) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Pre-samples the names, neighborhoods and phone numbers documents are filled with. Faker is slow (tens of
+    microseconds per value), so it is called a fixed number of times per seed instead of three times per document.
+    """
+    faker = Faker('pt_BR')
+    faker.seed_instance(seed)
+    names = [faker.name() for _ in range(NAME_POOL_SIZE)]
+    neighborhoods = [faker.bairro() for _ in range(NEIGHBORHOOD_POOL_SIZE)]
+    phones = [faker.phone_number() for _ in range(PHONE_POOL_SIZE)]
+    return names, neighborhoods, phones
+
+def build_vocabulary(size: int) -> List[str]:
+    """
+    Returns `size` keywords: the DISEASES followed by doenca11, doenca12, ... (in rank order for Zipfian corpora).
+    """
+    return DISEASES[:size] + [f"doenca{i}" for i in range(len(DISEASES) + 1, size + 1)]
+
 def generate_phone():
-    return fake.phone_number()
+    return random.choice(sample_pools()[2])
 
 def generate_patient_name():
-    return fake.name()
+    return random.choice(sample_pools()[0])
+
+def generate_neighborhood():
+    return random.choice(sample_pools()[1])
+
+def format_document(name: str, diseases: Iterable[str], age: str, neighborhood: str, phone: str) -> str:
+    return (
+        f"Name: {name}\n"
+        f"Disease: {', '.join(diseases)}\n"
+        f"Age: {age}\n"
+        f"Neighborhood: {neighborhood}\n"
+        f"Phone: {phone}\n"
+    )
 
 def generate_documents(n, output_folder="data/documents", max_diseases_per_patient=5, fixed_disease="hepatite", fixed_proportion=0.4):
     os.makedirs(output_folder, exist_ok=True)
@@ -57,7 +107,7 @@ def generate_documents(n, output_folder="data/documents", max_diseases_per_patie
     for i in range(1, n + 1):
         name = generate_patient_name()
         age = str(random.choice(AGE_RANGE))
-        neighborhood = fake.bairro()
+        neighborhood = generate_neighborhood()
         phone = generate_phone()
 
         # Select diseases for the patient
@@ -66,13 +116,7 @@ def generate_documents(n, output_folder="data/documents", max_diseases_per_patie
         while len(diseases) < num_diseases and disease_pool:
             diseases.add(disease_pool.pop())
 
-        content = (
-            f"Name: {name}\n"
-            f"Disease: {', '.join(diseases)}\n"
-            f"Age: {age}\n"
-            f"Neighborhood: {neighborhood}\n"
-            f"Phone: {phone}\n"
-        )
+        content = format_document(name, diseases, age, neighborhood, phone)
 
         file_path = os.path.join(output_folder, f"doc{i}.txt")
         with open(file_path, "w", encoding="utf-8") as f:
@@ -90,7 +134,7 @@ def generate_documents_fixed_keyword(n: int, output_folder="data/documents", key
     for i in range(n):
         name = generate_patient_name()
         age = str(random.choice(AGE_RANGE))
-        neighborhood = fake.bairro()
+        neighborhood = generate_neighborhood()
         phone = generate_phone()
 
         diseases: List[str] = []
@@ -109,13 +153,7 @@ def generate_documents_fixed_keyword(n: int, output_folder="data/documents", key
                     if len(diseases) == max_diseases_per_patient:
                         break
 
-        content = (
-            f"Name: {name}\n"
-            f"Disease: {', '.join(diseases)}\n"
-            f"Age: {age}\n"
-            f"Neighborhood: {neighborhood}\n"
-            f"Phone: {phone}\n"
-        )
+        content = format_document(name, diseases, age, neighborhood, phone)
 
         file_path = os.path.join(output_folder, f"doc{i}.txt")
         with open(file_path, "w", encoding="utf-8") as f:
@@ -123,34 +161,12 @@ def generate_documents_fixed_keyword(n: int, output_folder="data/documents", key
 
     return keyword_indices 
 
-def generate_documents_with_keywords_per_doc(n: int, keywords_per_doc: int, output_folder: str = "data/documents"):
+def generate_documents_with_keywords_per_doc(n: int, keywords_per_doc: int, output_folder: str = "data/documents",
+                                             vocabulary_size: int = 100):
     """
-    Generates `n` documents, each containing exactly `keywords_per_doc` keywords (diseases).
+    Generates `n` documents, each containing exactly `keywords_per_doc` keywords (diseases) out of `vocabulary_size`.
     """
-    DISEASES = [
-        "diabetes", "hipertensao", "asma", "covid", "bronquite", "cancer",
-        "dengue", "gripe", "hepatite", "alergia",
-        "doenca11", "doenca12", "doenca13", "doenca14", "doenca15",
-        "doenca16", "doenca17", "doenca18", "doenca19", "doenca20",
-        "doenca21", "doenca22", "doenca23", "doenca24", "doenca25",
-        "doenca26", "doenca27", "doenca28", "doenca29", "doenca30",
-        "doenca31", "doenca32", "doenca33", "doenca34", "doenca35",
-        "doenca36", "doenca37", "doenca38", "doenca39", "doenca40",
-        "doenca41", "doenca42", "doenca43", "doenca44", "doenca45",
-        "doenca46", "doenca47", "doenca48", "doenca49", "doenca50",
-        "doenca51", "doenca52", "doenca53", "doenca54", "doenca55",
-        "doenca56", "doenca57", "doenca58", "doenca59", "doenca60",
-        "doenca61", "doenca62", "doenca63", "doenca64", "doenca65",
-        "doenca66", "doenca67", "doenca68", "doenca69", "doenca70",
-        "doenca71", "doenca72", "doenca73", "doenca74", "doenca75",
-        "doenca76", "doenca77", "doenca78", "doenca79", "doenca80",
-        "doenca81", "doenca82", "doenca83", "doenca84", "doenca85",
-        "doenca86", "doenca87", "doenca88", "doenca89", "doenca90",
-        "doenca91", "doenca92", "doenca93", "doenca94", "doenca95",
-        "doenca96", "doenca97", "doenca98", "doenca99", "doenca100"
-    ]
-
-
+    DISEASES = build_vocabulary(vocabulary_size)
     DISEASE_PROPORTIONS = {d: 1/len(DISEASES) for d in DISEASES}
 
     os.makedirs(output_folder, exist_ok=True)
@@ -162,19 +178,102 @@ def generate_documents_with_keywords_per_doc(n: int, keywords_per_doc: int, outp
     for i in range(n):
         name = generate_patient_name()
         age = str(random.choice(AGE_RANGE))
-        neighborhood = fake.bairro()
+        neighborhood = generate_neighborhood()
         phone = generate_phone()
 
         diseases = random.sample(all_diseases, keywords_per_doc)
 
-        content = (
-            f"Name: {name}\n"
-            f"Disease: {', '.join(diseases)}\n"
-            f"Age: {age}\n"
-            f"Neighborhood: {neighborhood}\n"
-            f"Phone: {phone}\n"
-        )
+        content = format_document(name, diseases, age, neighborhood, phone)
 
         file_path = os.path.join(output_folder, f"doc{i}.txt")
         with open(file_path, "w", encoding="utf-8") as f:
-            f.write(content)
\ No newline at end of file
+            f.write(content)
+
+def _keyword_weights(distribution: str, vocabulary: List[str], zipf_exponent: float) -> List[float]:
+    """
+    Returns the cumulative weights used to draw keywords from the vocabulary.
+    """
+    if distribution == DISTRIBUTION_ZIPF:
+        weights = [1 / rank ** zipf_exponent for rank in range(1, len(vocabulary) + 1)]
+    elif distribution == DISTRIBUTION_UNIFORM:
+        weights = [1.0] * len(vocabulary)
+    elif distribution == DISTRIBUTION_PROPORTIONS:
+        weights = [DISEASE_PROPORTIONS.get(keyword, 0.0) for keyword in vocabulary]
+    else:
+        raise ValueError(f"Unknown keyword distribution: {distribution}")
+    return list(itertools.accumulate(weights))
+
+def _init_corpus_worker(state):
+    global _corpus_state
+    _corpus_state = state
+
+def _generate_chunk(task) -> int:
+    """
+    Generates one chunk of generate_corpus. The chunk draws from its own generator seeded with (seed, chunk index),
+    so the corpus does not depend on the number of workers or on the order in which chunks are generated.
+
+    - Input: (seed, chunk index, first document number, number of documents, output folder, layout)
+    - Output: number of (w, id) pairs written
+    """
+    seed, chunk, first, count, output_folder, layout = task
+    (names, neighborhoods, phones), vocabulary, cum_weights, min_keywords, max_keywords = _corpus_state
+    rng = random.Random(f"{seed}:{chunk}")
+    total = cum_weights[-1]
+
+    documents = []
+    pairs = 0
+    for i in range(first, first + count):
+        k = rng.randint(min_keywords, max_keywords)
+        keywords = {}  # distinct keywords in draw order
+        while len(keywords) < k:
+            keywords[vocabulary[bisect.bisect(cum_weights, rng.random() * total)]] = None
+        pairs += k
+        content = format_document(rng.choice(names), keywords, str(rng.randrange(AGE_RANGE.start, AGE_RANGE.stop)),
+                                  rng.choice(neighborhoods), rng.choice(phones))
+        documents.append((f"doc{i}.txt", content))
+
+    if layout == LAYOUT_PACKED:
+        write_packed_documents(os.path.join(output_folder, f"shard{chunk:05d}{PACK_SUFFIX}"), documents)
+        return pairs
+
+    folder = output_folder if layout == LAYOUT_FILES else os.path.join(output_folder, f"shard{chunk:05d}")
+    os.makedirs(folder, exist_ok=True)
+    for doc_id, content in documents:
+        with open(os.path.join(folder, doc_id), "w", encoding="utf-8") as f:
+            f.write(content)
+    return pairs
+
+def generate_corpus(n: int, output_folder: str = "data/documents", seed: int = 0, vocabulary_size: int = 1_000,
+                    distribution: str = DISTRIBUTION_ZIPF, zipf_exponent: float = 1.0, min_keywords: int = 1,
+                    max_keywords: int = 5, layout: str = LAYOUT_FILES, workers: int = 1,
+                    chunk_size: int = CORPUS_CHUNK_SIZE) -> int:
+    """
+    Generates a reproducible corpus of `n` documents (doc1.txt ... doc<n>.txt) and returns its number of (w, id) pairs.
+
+    Documents have the same fields as the other generators. Names, neighborhoods and phones come from pools
+    pre-sampled with Faker (see sample_pools), and every document gets between `min_keywords` and `max_keywords`
+    distinct keywords drawn from build_vocabulary(vocabulary_size) with the given distribution. The same arguments
+    always produce the same corpus, whatever the number of workers.
+
+    The corpus is generated in chunks of `chunk_size` documents, in a process pool when workers > 1, and written
+    with `layout`: LAYOUT_FILES (one file per document), LAYOUT_SHARDED (one subfolder per chunk) or LAYOUT_PACKED
+    (one packed shard per chunk). Every layout can be read by core.pipeline.scan_documents / ingest.
+    """
+    if layout not in (LAYOUT_FILES, LAYOUT_SHARDED, LAYOUT_PACKED):
+        raise ValueError(f"Unknown layout: {layout}")
+    vocabulary = DISEASES if distribution == DISTRIBUTION_PROPORTIONS else build_vocabulary(vocabulary_size)
+    if not 1 <= min_keywords <= max_keywords <= len(vocabulary):
+        raise ValueError(f"Invalid keyword range [{min_keywords}, {max_keywords}] for {len(vocabulary)} keywords")
+    os.makedirs(output_folder, exist_ok=True)
+
+    state = (sample_pools(seed), vocabulary, _keyword_weights(distribution, vocabulary, zipf_exponent),
+             min_keywords, max_keywords)
+    tasks = [(seed, chunk, first, min(chunk_size, n + 1 - first), output_folder, layout)
+             for chunk, first in enumerate(range(1, n + 1, chunk_size))]
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_corpus_worker, initargs=(state,)) as pool:
+            return sum(pool.map(_generate_chunk, tasks))
+
+    _init_corpus_worker(state)
+    return sum(_generate_chunk(task) for task in tasks)